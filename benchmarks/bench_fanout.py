@@ -0,0 +1,69 @@
+"""Sunucu ses dağıtımı için kare başına CPU süresi ölçümü.
+
+Eski yöntem (her dinleyiciye ayrı emit) ile tek kodlamalı AudioFanout'u
+farklı oda büyüklüklerinde karşılaştırır. Ağ yerine Engine.IO paketleri
+sadece kodlanır, böylece ölçülen süre sunucunun kendi işidir.
+
+Kullanım:
+    python benchmarks/bench_fanout.py [--frames 200] [--sizes 2 10 50 200]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import socketio
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "server"))
+from fanout import AudioFanout  # noqa: E402
+
+FRAME = bytes(4096)  # 1024 örneklik float32 paket
+
+
+async def setup_room(size):
+    sio = socketio.AsyncServer(async_mode='aiohttp')
+
+    async def send_packet(eio_sid, pkt):
+        pkt.encode()  # Taşıma katmanının serileştirme maliyeti
+
+    sio.eio.send_packet = send_packet
+    sids = []
+    for i in range(size):
+        sids.append(await sio.manager.connect(f'eio-{i}', '/'))
+    return sio, sids
+
+
+async def legacy(sio, sids, frames):
+    sender = sids[0]
+    for _ in range(frames):
+        for user_sid in sids:
+            if user_sid != sender:
+                await sio.emit('audio_data', {'audio': FRAME, 'sender_sid': sender}, room=user_sid)
+
+
+async def fanout(sio, sids, frames):
+    sender = sids[0]
+    audio_fanout = AudioFanout(sio)
+    for _ in range(frames):
+        recipients = [user_sid for user_sid in sids if user_sid != sender]
+        await audio_fanout.broadcast('audio_data', {'audio': FRAME, 'sender_sid': sender}, recipients)
+
+
+async def main(args):
+    print(f"{'oda':>6} {'eski (ms/kare)':>16} {'fanout (ms/kare)':>18} {'hızlanma':>10}")
+    for size in args.sizes:
+        results = []
+        for method in (legacy, fanout):
+            sio, sids = await setup_room(size)
+            start = time.process_time()
+            await method(sio, sids, args.frames)
+            results.append((time.process_time() - start) * 1000 / args.frames)
+        print(f"{size:>6} {results[0]:>16.3f} {results[1]:>18.3f} {results[0] / results[1]:>9.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2, 10, 50, 200])
+    asyncio.run(main(parser.parse_args()))
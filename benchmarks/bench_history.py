@@ -0,0 +1,88 @@
+"""Oda geçmişi sorgusunun mesaj sayısına göre gecikmesi.
+
+Her boyut için geçici bir SQLite veritabanı oluşturur, mesajları odalara
+dağıtarak ekler ve Database.get_room_messages() süresini
+ix_messages_room_timestamp indeksi varken ve yokken ölçer.
+
+Kullanım:
+    python benchmarks/bench_history.py [--sizes 10000 1000000 10000000] [--rooms 100]
+
+Not: 10M mesajlık veritabanı diskte birkaç GB yer kaplar ve oluşturulması
+birkaç dakika sürer.
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "server"))
+from database import Database  # noqa: E402
+
+INSERT_BATCH = 50000
+
+
+async def populate(db, path, size, room_count):
+    """size adet mesajı room_count odaya rastgele dağıt"""
+    # Toplu ekleme doğrudan sqlite3 ile yapılır; şema ve tetikleyiciler db.open() ile kuruldu
+    raw = sqlite3.connect(path)
+    try:
+        raw.execute("DELETE FROM rooms")
+        raw.executemany("INSERT INTO rooms (name) VALUES (?)", [(f"oda-{i}",) for i in range(room_count)])
+        raw.commit()
+        await db._load_room_ids()
+        room_ids = list(db.room_ids.values())
+
+        start = datetime(2024, 1, 1)
+        for offset in range(0, size, INSERT_BATCH):
+            rows = [
+                (random.choice(room_ids), f"user{i % 500}", f"mesaj {i}",
+                 (start + timedelta(seconds=i)).isoformat(sep=' '))
+                for i in range(offset, min(size, offset + INSERT_BATCH))
+            ]
+            raw.executemany(
+                "INSERT INTO messages (room_id, username, content, timestamp) VALUES (?, ?, ?, ?)", rows)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+async def measure(db, room_names, repeats):
+    timings = []
+    for _ in range(repeats):
+        room_name = random.choice(room_names)
+        begin = time.perf_counter()
+        await db.get_room_messages(room_name, limit=50)
+        timings.append((time.perf_counter() - begin) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+async def main(args):
+    print(f"{'mesaj':>10} {'indeksli p50/max (ms)':>24} {'indekssiz p50/max (ms)':>25}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(f"sqlite:///{tmp}/bench.db")
+            await db.open()
+            await populate(db, f"{tmp}/bench.db", size, args.rooms)
+            room_names = list(db.room_ids)
+
+            indexed = await measure(db, room_names, args.repeats)
+            async with db.engine.begin() as conn:
+                await conn.exec_driver_sql("DROP INDEX ix_messages_room_timestamp")
+            unindexed = await measure(db, room_names, max(3, args.repeats // 10))
+
+            print(f"{size:>10} {indexed[0]:>11.3f} / {indexed[1]:<10.3f} {unindexed[0]:>11.3f} / {unindexed[1]:<10.3f}")
+            await db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 1000000, 10000000])
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
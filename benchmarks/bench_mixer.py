@@ -0,0 +1,114 @@
+"""Oda başına ses dağıtım maliyeti: ileti modu ile server'da karıştırma.
+
+Her periyotta `speakers` konuşmacının paketi `listeners` kişilik odaya
+dağıtılır. İleti modunda her paket AudioFanout ile bütün dinleyicilere
+gönderilir; karıştırma modunda paketler çözülür, RoomMixer ile karıştırılıp
+dinleyicinin codec'iyle yeniden kodlanır. Ağ yerine Engine.IO paketleri
+sadece kodlanır; tablo periyot başına CPU süresini ve dinleyici başına
+giden baytı gösterir. Periyot 1024 örnek / 44.1 kHz ≈ 23.2 ms olduğundan
+%100 CPU'ya denk gelen süre de budur.
+
+Kullanım:
+    python benchmarks/bench_mixer.py [--frames 100] [--listeners 10 50 200]
+                                     [--speakers 1 3 6] [--codecs pcm16 adpcm]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import socketio
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "server"))
+from common import protocol  # noqa: E402
+from common.codec import get_codec  # noqa: E402
+from fanout import AudioFanout  # noqa: E402
+from mixer import AudioMixer  # noqa: E402
+
+FRAME_COUNT = 1024
+RATE = 44100
+PERIOD_MS = FRAME_COUNT * 1000 / RATE
+
+
+def speaker_frames(speakers, codec_name, frames):
+    """Konuşmacı başına farklı frekansta, önceden kodlanmış paketler"""
+    codec = get_codec(codec_name)
+    result = []
+    for seq in range(frames):
+        t = (np.arange(FRAME_COUNT) + seq * FRAME_COUNT) / RATE
+        result.append([
+            protocol.pack_frame(1, sender, seq, 0, codec.codec_id,
+                                codec.encode((0.2 * np.sin(2 * np.pi * 220 * sender * t)).astype(np.float32).tobytes()),
+                                level=20)
+            for sender in range(1, speakers + 1)
+        ])
+    return result
+
+
+async def setup_room(size):
+    sio = socketio.AsyncServer(async_mode='aiohttp')
+    sent = {'bytes': 0}
+
+    async def send_packet(eio_sid, pkt):
+        sent['bytes'] += len(pkt.encode())  # Taşıma katmanının serileştirme maliyeti
+
+    sio.eio.send_packet = send_packet
+    sids = []
+    for i in range(size):
+        sids.append(await sio.manager.connect(f'eio-{i}', '/'))
+    return sio, sids, sent
+
+
+async def forward(sio, sids, frames, codec_name):
+    audio_fanout = AudioFanout(sio)
+    for tick in frames:
+        for sender, frame in enumerate(tick, start=1):
+            # Konuşmacılar odanın ilk üyeleri; kendi paketleri kendilerine gitmez
+            await audio_fanout.broadcast('audio_data', frame, sids[:sender - 1] + sids[sender:])
+
+
+async def mix(sio, sids, frames, codec_name):
+    listeners = [(sid, member_id, codec_name) for member_id, sid in enumerate(sids, start=1)]
+    audio_mixer = AudioMixer(AudioFanout(sio), lambda room_name: listeners, FRAME_COUNT, RATE)
+    audio_mixer.set_mode('oda', 1, 'mix')
+    room = audio_mixer.rooms['oda']
+    room.task.cancel()  # Saat yerine vuruşlar burada art arda çalıştırılır
+    for tick in frames:
+        for frame in tick:
+            audio_mixer.push('oda', frame)
+        for frame, recipients in room.mix(listeners):
+            await audio_mixer.fanout.broadcast('audio_data', frame, recipients)
+
+
+async def main(args):
+    print(f"{'codec':>6} {'dinleyici':>9} {'konuşan':>8} {'ileti (ms)':>11} {'karışım (ms)':>13} "
+          f"{'CPU %':>6} {'ileti B/dinleyici':>18} {'karışım B/dinleyici':>20}")
+    for codec_name in args.codecs:
+        for speakers in args.speakers:
+            frames = speaker_frames(speakers, codec_name, args.frames)
+            for size in args.listeners:
+                if size < speakers:
+                    continue
+                results = []
+                for method in (forward, mix):
+                    sio, sids, sent = await setup_room(size)
+                    start = time.process_time()
+                    await method(sio, sids, frames, codec_name)
+                    elapsed = (time.process_time() - start) * 1000 / args.frames
+                    results.append((elapsed, sent['bytes'] / args.frames / size))
+                (forward_ms, forward_bytes), (mix_ms, mix_bytes) = results
+                print(f"{codec_name:>6} {size:>9} {speakers:>8} {forward_ms:>11.3f} {mix_ms:>13.3f} "
+                      f"{mix_ms / PERIOD_MS * 100:>5.1f}% {forward_bytes:>18.0f} {mix_bytes:>20.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--listeners', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--speakers', type=int, nargs='+', default=[1, 3, 6])
+    parser.add_argument('--codecs', nargs='+', default=['pcm16', 'adpcm'])
+    asyncio.run(main(parser.parse_args()))
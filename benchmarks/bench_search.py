@@ -0,0 +1,99 @@
+"""FTS5 araması ile LIKE taramasının karşılaştırması.
+
+Her boyut için geçici bir veritabanına rastgele kelimelerden oluşan
+mesajlar ekler (FTS indeksi tetikleyicilerle dolar), sonra aynı kelimeleri
+Database.search_messages() ve `content LIKE '%kelime%'` ile arar.
+
+Kullanım:
+    python benchmarks/bench_search.py [--sizes 100000 1000000] [--rooms 100]
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import text
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "server"))
+from database import Database  # noqa: E402
+
+INSERT_BATCH = 50000
+VOCABULARY = [f"kelime{i}" for i in range(20000)]
+
+
+async def populate(db, path, size, room_count):
+    # Toplu ekleme doğrudan sqlite3 ile yapılır; şema ve tetikleyiciler db.open() ile kuruldu
+    raw = sqlite3.connect(path)
+    try:
+        raw.execute("DELETE FROM rooms")
+        raw.executemany("INSERT INTO rooms (name) VALUES (?)", [(f"oda-{i}",) for i in range(room_count)])
+        raw.commit()
+        await db._load_room_ids()
+        room_ids = list(db.room_ids.values())
+
+        start = datetime(2024, 1, 1)
+        for offset in range(0, size, INSERT_BATCH):
+            rows = [
+                (random.choice(room_ids), f"user{i % 500}",
+                 ' '.join(random.choices(VOCABULARY, k=random.randint(3, 15))),
+                 (start + timedelta(seconds=i)).isoformat(sep=' '))
+                for i in range(offset, min(size, offset + INSERT_BATCH))
+            ]
+            raw.executemany(
+                "INSERT INTO messages (room_id, username, content, timestamp) VALUES (?, ?, ?, ?)", rows)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+async def like_search(db, word, room_id, limit):
+    async with db.engine.connect() as conn:
+        return (await conn.execute(text(
+            "SELECT id FROM messages WHERE room_id = :room_id AND content LIKE :pattern "
+            "ORDER BY timestamp DESC LIMIT :limit"),
+            {'room_id': room_id, 'pattern': f"%{word}%", 'limit': limit})).all()
+
+
+async def timed(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - begin) * 1000)
+    return statistics.median(timings)
+
+
+async def main(args):
+    print(f"{'mesaj':>10} {'FTS5 p50 (ms)':>15} {'LIKE p50 (ms)':>15} {'hızlanma':>10}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(f"sqlite:///{tmp}/bench.db")
+            await db.open()
+            await populate(db, f"{tmp}/bench.db", size, args.rooms)
+            room_names = list(db.room_ids)
+
+            def fts():
+                return db.search_messages(random.choice(VOCABULARY), random.choice(room_names), limit=20)
+
+            def like():
+                room_id = db.room_ids[random.choice(room_names)]
+                return like_search(db, random.choice(VOCABULARY), room_id, 20)
+
+            fts_ms = await timed(fts, args.repeats)
+            like_ms = await timed(like, max(3, args.repeats // 10))
+            print(f"{size:>10} {fts_ms:>15.3f} {like_ms:>15.3f} {like_ms / fts_ms:>9.1f}x")
+            await db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,171 @@
+"""Çok süreçli server'da ses dağıtım kapasitesinin worker sayısıyla değişimi.
+
+Her worker sayısı için server/workers.py'yi geçici bir veritabanıyla
+başlatır. İstemciler ayrı süreçlerde çalışır: her odada bir konuşmacı sabit
+hızda paket gönderir, diğerleri dinler. Dinleyicilere ulaşan paket sayısı,
+teslim oranı ve uçtan uca gecikme raporlanır. Kullanıcılar bağlantı kabul
+eden worker'lara rastgele dağıldığından paketlerin bir kısmı mesaj yolu
+üzerinden diğer worker'lara da aktarılır.
+
+Kullanım:
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--rooms 16] [--listeners 10]
+                                       [--rate 43] [--duration 10] [--client-procs 4]
+
+Not: Server worker'ları ve istemci süreçleri aynı makinede çalışır; anlamlı
+bir ölçeklenme için makinede worker + istemci süreci sayısı kadar çekirdek
+olmalıdır.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import socketio
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from common import protocol  # noqa: E402
+
+PAYLOAD = bytes(512)  # ~1024 örneklik ADPCM paketi
+
+
+async def connect(url, username, room):
+    client = socketio.AsyncClient()
+    await client.connect(url, transports=['websocket'])
+    await client.call('login', username)
+    response = await client.call('join_room', {'room': room, 'codecs': ['adpcm']})
+    return client, response['stream_id']
+
+
+async def run_rooms(url, rooms, listeners, rate, duration, barrier):
+    """Bir istemci sürecinin odaları: (gönderilen, teslim edilen, gecikmeler)"""
+    received = [0]
+    latencies = []
+
+    def on_audio(data):
+        received[0] += 1
+        if received[0] % 10 == 0:
+            latencies.append(protocol.elapsed_ms(protocol.unpack_frame(data).timestamp))
+
+    clients = []
+    speakers = []
+    for room in rooms:
+        for i in range(listeners):
+            client, _ = await connect(url, f"{room}-dinleyici{i}", room)
+            client.on('audio_data', on_audio)
+            clients.append(client)
+        client, stream_id = await connect(url, f"{room}-konuşmacı", room)
+        clients.append(client)
+        speakers.append((client, stream_id))
+
+    # Bütün süreçler hazır olunca aynı anda gönder
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+
+    async def speak(client, stream_id):
+        sent = 0
+        interval = 1 / rate
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            frame = protocol.pack_frame(stream_id, 0, sent, protocol.now_ms(), 0, PAYLOAD)
+            await client.emit('audio_data', frame)
+            sent += 1
+            await asyncio.sleep(max(0, start + sent * interval - time.perf_counter()))
+        return sent
+
+    sent = sum(await asyncio.gather(*(speak(client, stream_id) for client, stream_id in speakers)))
+    await asyncio.sleep(1)  # Yoldaki paketler
+    for client in clients:
+        await client.disconnect()
+    return sent, received[0], latencies
+
+
+def client_process(url, rooms, listeners, rate, duration, barrier, results):
+    results.put(asyncio.run(run_rooms(url, rooms, listeners, rate, duration, barrier)))
+
+
+def start_server(workers, port, tmp):
+    log = open(os.path.join(tmp, f'server-{workers}.log'), 'w')
+    process = subprocess.Popen(
+        [sys.executable, str(ROOT / 'server' / 'workers.py'), '--workers', str(workers),
+         '--port', str(port), '--db', f"sqlite:///{tmp}/bench-{workers}.db"],
+        stdout=log, stderr=subprocess.STDOUT)
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/")
+            break
+        except OSError:
+            time.sleep(0.1)
+    time.sleep(0.5 * workers)  # Bütün worker'lar dinlemeye başlasın
+    return process
+
+
+async def create_rooms(url, names):
+    client = socketio.AsyncClient()
+    await client.connect(url, transports=['websocket'])
+    await client.call('login', 'hazırlık')
+    for name in names:
+        await client.call('create_room', {'room': name})
+    await client.disconnect()
+
+
+def measure(args, workers, tmp):
+    url = f"http://127.0.0.1:{args.port}"
+    server = start_server(workers, args.port, tmp)
+    try:
+        rooms = [f"yük-{i}" for i in range(args.rooms)]
+        asyncio.run(create_rooms(url, rooms))
+
+        procs = min(args.client_procs, args.rooms)
+        barrier = multiprocessing.Barrier(procs)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(
+            target=client_process,
+            args=(url, rooms[i::procs], args.listeners, args.rate, args.duration, barrier, results))
+            for i in range(procs)]
+        for process in processes:
+            process.start()
+        outcome = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait(30)
+
+    sent = sum(result[0] for result in outcome)
+    delivered = sum(result[1] for result in outcome)
+    latencies = sorted(latency for result in outcome for latency in result[2])
+    expected = sent * args.listeners
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    return delivered / args.duration, delivered / expected if expected else 0, \
+        statistics.median(latencies) if latencies else 0, p99
+
+
+def main(args):
+    offered = args.rooms * args.listeners * args.rate
+    print(f"{args.rooms} oda x {args.listeners} dinleyici, {args.rate} paket/sn "
+          f"-> istenen {offered} teslim/sn")
+    print(f"{'worker':>7} {'teslim/sn':>11} {'oran':>7} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            rate, ratio, p50, p99 = measure(args, workers, tmp)
+            print(f"{workers:>7} {rate:>11.0f} {ratio:>6.1%} {p50:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--rooms', type=int, default=16)
+    parser.add_argument('--listeners', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=43)  # 1024 örnek @ 44.1 kHz
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--client-procs', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8090)
+    main(parser.parse_args())
@@ -1,10 +1,15 @@
 import pyaudio
 import numpy as np
-from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtCore import QObject
 import threading
+from common.codec import get_codec, DEFAULT_CODEC
+from common import protocol
+from client.audio.playback_engine import PlaybackEngine
+from client.audio.vad import VoiceActivityDetector, frame_energy_db
 
 class AudioManager(QObject):
-    audio_data_ready = pyqtSignal(bytes)  # Ses verisi hazır olduğunda sinyal gönder
+    # Sessizlikte bu kadar pakette bir (~0.5s) canlılık işaretçisi gönderilir
+    KEEPALIVE_FRAMES = 20
     
     def __init__(self):
         super().__init__()
@@ -17,13 +22,27 @@ class AudioManager(QObject):
         self.recording = False
         self.playing = False
         
-        # Mikrofon ve hoparlör stream'leri
+        # Mikrofon stream'i
         self.input_stream = None
-        self.output_stream = None
         
         # Thread kontrolü için
         self.record_thread = None
         
+        # Kodlanmış paketlerin doğrudan verildiği ağ kuyruğu: capture_sink(payload, timestamp, flags, level)
+        self.capture_sink = None
+        
+        # Sessiz paketleri göndermemek için konuşma algılama (DTX)
+        self.vad = VoiceActivityDetector()
+        self.vad_enabled = True
+        self.suppressed_frames = 0  # Son işaretçiden bu yana gönderilmeyen paketler
+        self.total_suppressed = 0
+        
+        # Hoparlör tarafı: jitter tamponları, karıştırıcı ve callback stream'i
+        self.playback = PlaybackEngine(self.p, self.RATE, self.CHUNK, self.CHANNELS)
+        
+        # Kayıt ile gönderim, alım ile çalma arasındaki kodlama katmanı
+        self.codec = get_codec(DEFAULT_CODEC)
+        
     def start_recording(self):
         """Mikrofon kaydını başlat"""
         try:
@@ -70,13 +89,7 @@ class AudioManager(QObject):
         try:
             if not self.playing:
                 self.playing = True
-                self.output_stream = self.p.open(
-                    format=self.FORMAT,
-                    channels=self.CHANNELS,
-                    rate=self.RATE,
-                    output=True,
-                    frames_per_buffer=self.CHUNK
-                )
+                self.playback.start()
                 print("Hoparlör başlatıldı")
         except Exception as e:
             print(f"Hoparlör başlatma hatası: {e}")
@@ -86,21 +99,38 @@ class AudioManager(QObject):
         """Ses çalmayı durdur"""
         try:
             self.playing = False
-            if self.output_stream:
-                self.output_stream.stop_stream()
-                self.output_stream.close()
-                self.output_stream = None
+            self.playback.stop()
             print("Hoparlör durduruldu")
         except Exception as e:
             print(f"Hoparlör durdurma hatası: {e}")
             
-    def play_audio(self, audio_data):
-        """Gelen ses verisini çal"""
-        if self.playing and self.output_stream:
-            try:
-                self.output_stream.write(audio_data)
-            except Exception as e:
-                print(f"Ses çalma hatası: {e}")
+    def set_codec(self, codec_name):
+        """Server ile anlaşılan codec'i kullanmaya başla"""
+        self.codec = get_codec(codec_name)
+        print(f"Ses codec'i: {codec_name}")
+            
+    def receive_frame(self, frame):
+        """Ağ thread'inden gelen ses paketini çalma motoruna aktar"""
+        try:
+            self.playback.receive_frame(frame)
+        except Exception as e:
+            print(f"Ses paketi işleme hatası: {e}")
+            
+    def remove_sender(self, sender):
+        """Ayrılan kullanıcının tamponunu kaldır"""
+        self.playback.remove_sender(sender)
+
+    def clear_senders(self):
+        """Ses akışlarının gönderenleri değiştiğinde (ör. oda karıştırma moduna geçtiğinde) tamponları bırak"""
+        self.playback.clear_senders()
+        
+    def set_user_gain(self, sender, gain):
+        """Bir kullanıcının ses seviyesini ayarla"""
+        self.playback.mixer.set_gain(sender, gain)
+        
+    def get_jitter_stats(self):
+        """Gönderen başına tampon derinliği, geç gelen ve gizlenen paket sayıları"""
+        return self.playback.get_stats()
                 
     def _record_thread(self):
         """Sürekli mikrofon kaydı yapan thread"""
@@ -109,7 +139,28 @@ class AudioManager(QObject):
             try:
                 if self.input_stream:
                     data = self.input_stream.read(self.CHUNK, exception_on_overflow=False)
-                    self.audio_data_ready.emit(data)
+                    timestamp = protocol.now_ms()
+                    samples = np.frombuffer(data, dtype=np.float32)
+                    
+                    if self.vad_enabled and not self.vad.is_speech(samples):
+                        # Sessizlik: gönderme, arada bir canlılık işaretçisi yolla
+                        self.suppressed_frames += 1
+                        self.total_suppressed += 1
+                        if self.suppressed_frames >= self.KEEPALIVE_FRAMES and self.capture_sink:
+                            self.capture_sink(protocol.pack_silence(self.suppressed_frames),
+                                              timestamp, protocol.FLAG_SILENCE)
+                            self.suppressed_frames = 0
+                        continue
+                    
+                    if self.capture_sink:
+                        if self.suppressed_frames:
+                            # Konuşma başlamadan önce kalan sessizliği de bildir
+                            self.capture_sink(protocol.pack_silence(self.suppressed_frames),
+                                              timestamp, protocol.FLAG_SILENCE)
+                            self.suppressed_frames = 0
+                        # Server etkin konuşmacıları bu seviyeye göre sıralar
+                        energy_db = self.vad.energy_db if self.vad_enabled else frame_energy_db(samples)
+                        self.capture_sink(self.codec.encode(data), timestamp, 0, protocol.level_from_db(energy_db))
             except Exception as e:
                 print(f"Kayıt hatası: {e}")
                 break
@@ -157,6 +208,8 @@ class AudioManager(QObject):
         self.output_device = settings['output_device']
         self.input_volume = settings['mic_volume'] / 100.0
         self.output_volume = settings['speaker_volume'] / 100.0
+        self.playback.mixer.master_gain = self.output_volume
+        self.vad.set_sensitivity(settings['sensitivity'])
         
         # Eğer kayıt veya çalma aktifse, yeni ayarlarla tekrar başlat
         if self.recording:
@@ -0,0 +1,147 @@
+import math
+import threading
+from common import protocol
+
+
+class JitterBuffer:
+    """Tek bir gönderen için uyarlamalı jitter tamponu.
+
+    Paketler sıra numarasına göre dizilir; hedef derinlik ölçülen ağ
+    jitter'ına (RFC 3550 tahmini) göre büyür veya küçülür. Kısa kayıplar son
+    paketin sönümlenen tekrarıyla gizlenir, oynatma anını kaçırmış paketler
+    atılır.
+    """
+
+    # Sıra numarası bu kadar sıçrarsa gönderen yeniden başlamış kabul edilir
+    RESET_GAP = 1000
+
+    def __init__(self, frame_ms, min_depth=1, max_depth=12, max_conceal=3):
+        self.frame_ms = frame_ms
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.max_conceal = max_conceal
+
+        self.lock = threading.Lock()
+        self.frames = {}  # {seq: float32 örnekler}
+        self.next_seq = None  # Sıradaki oynatılacak paket (tampon dolarken None)
+
+        self.target_depth = min_depth
+        self.jitter_ms = 0.0
+        self.last_transit = None
+
+        self.last_samples = None
+        self.concealed_run = 0
+
+        # İstatistikler
+        self.played = 0
+        self.late_drops = 0
+        self.concealed = 0
+        self.drained = 0
+
+    def push(self, seq, timestamp, samples, arrival_ms=None):
+        """Gelen paketi tampona ekle. Geç kalmışsa False döner."""
+        if arrival_ms is None:
+            arrival_ms = protocol.now_ms()
+
+        with self.lock:
+            self._update_jitter(timestamp, arrival_ms)
+
+            if self.next_seq is not None:
+                gap = protocol.seq_diff(seq, self.next_seq)
+                if abs(gap) > self.RESET_GAP:
+                    self._reset()
+                elif gap < 0:
+                    self.late_drops += 1
+                    return False
+
+            if seq in self.frames:
+                return False
+            self.frames[seq] = samples
+
+            # Tampon taşarsa en eski paketleri atarak gecikmeyi sınırla
+            while len(self.frames) > self.max_depth:
+                self._drop_oldest()
+            return True
+
+    def pop(self):
+        """Bir sonraki oynatma periyodunun örneklerini getir (yoksa None)"""
+        with self.lock:
+            if self.next_seq is None:
+                # Hedef derinliğe ulaşana kadar tamponu doldur
+                if not self.frames or len(self.frames) < self.target_depth:
+                    return None
+                self.next_seq = self._oldest_seq()
+
+            # Hedefin belirgin üstündeyse birikmiş gecikmeyi yavaşça boşalt
+            if len(self.frames) > self.target_depth + 2:
+                self._drop_oldest()
+
+            if self.next_seq in self.frames:
+                return self._take()
+
+            if self.last_samples is not None and self.concealed_run < self.max_conceal:
+                # Kısa kayıp: son paketi sönümleyerek tekrarla
+                self.concealed_run += 1
+                self.concealed += 1
+                self.next_seq = (self.next_seq + 1) % protocol.SEQ_MODULO
+                return self.last_samples * (0.5 ** self.concealed_run)
+
+            if self.frames:
+                # Gizlenemeyecek kadar uzun boşluk: sıradaki mevcut pakete atla
+                self.next_seq = self._oldest_seq()
+                return self._take()
+
+            # Akış kesildi: sessizliğe geç ve tamponu yeniden doldur
+            self.next_seq = None
+            self.last_samples = None
+            return None
+
+    def get_stats(self):
+        """Tampon istatistikleri"""
+        with self.lock:
+            return {
+                'depth': len(self.frames),
+                'target_depth': self.target_depth,
+                'jitter_ms': round(self.jitter_ms, 2),
+                'played': self.played,
+                'late_drops': self.late_drops,
+                'concealed': self.concealed,
+                'drained': self.drained
+            }
+
+    def _take(self):
+        samples = self.frames.pop(self.next_seq)
+        self.next_seq = (self.next_seq + 1) % protocol.SEQ_MODULO
+        self.last_samples = samples
+        self.concealed_run = 0
+        self.played += 1
+        return samples
+
+    def _update_jitter(self, timestamp, arrival_ms):
+        transit = (arrival_ms - timestamp) % protocol.TIMESTAMP_MODULO
+        if self.last_transit is not None:
+            delta = (transit - self.last_transit) % protocol.TIMESTAMP_MODULO
+            delta = min(delta, protocol.TIMESTAMP_MODULO - delta)
+            self.jitter_ms += (delta - self.jitter_ms) / 16
+        self.last_transit = transit
+
+        # Jitter'ın yaklaşık üç katını karşılayacak kadar paket tut
+        depth = math.ceil(3 * self.jitter_ms / self.frame_ms) + self.min_depth
+        self.target_depth = max(self.min_depth, min(self.max_depth, depth))
+
+    def _oldest_seq(self):
+        reference = next(iter(self.frames))
+        return min(self.frames, key=lambda seq: protocol.seq_diff(seq, reference))
+
+    def _drop_oldest(self):
+        del self.frames[self._oldest_seq()]
+        self.drained += 1
+        if self.next_seq is not None and self.frames:
+            self.next_seq = self._oldest_seq()
+
+    def _reset(self):
+        self.frames.clear()
+        self.next_seq = None
+        self.last_transit = None
+        self.last_samples = None
+        self.concealed_run = 0
@@ -0,0 +1,42 @@
+import threading
+import numpy as np
+from common.codec import soft_clip
+
+
+class Mixer:
+    """Aynı periyotta konuşan gönderenlerin paketlerini tek pakette karıştırır.
+
+    Her periyotta gönderen başına bir paket alınır, kullanıcı kazançlarıyla
+    ağırlıklı toplanır ve yumuşak kırpılır. Konuşan kişi sayısı ne olursa
+    olsun hoparlöre periyot başına tek paket yazılır.
+    """
+
+    def __init__(self, frame_count):
+        self.frame_count = frame_count
+        self.master_gain = 1.0
+        self.gains = {}  # {gönderen indeksi: kazanç}
+        self.lock = threading.Lock()
+
+    def set_gain(self, sender, gain):
+        """Bir kullanıcının ses seviyesini ayarla (1.0 = değişmez)"""
+        with self.lock:
+            self.gains[sender] = gain
+
+    def remove(self, sender):
+        with self.lock:
+            self.gains.pop(sender, None)
+
+    def mix(self, frames):
+        """{gönderen: örnekler} sözlüğünü tek bir float32 pakete karıştır"""
+        if not frames:
+            return np.zeros(self.frame_count, dtype=np.float32)
+
+        stack = np.zeros((len(frames), self.frame_count), dtype=np.float32)
+        for row, samples in enumerate(frames.values()):
+            count = min(len(samples), self.frame_count)
+            stack[row, :count] = samples[:count]
+
+        with self.lock:
+            gains = np.array([self.gains.get(sender, 1.0) for sender in frames], dtype=np.float32)
+        mixed = (gains * self.master_gain) @ stack
+        return soft_clip(mixed)
@@ -0,0 +1,106 @@
+import threading
+import pyaudio
+import numpy as np
+from common.codec import get_codec_by_id
+from client.audio.jitter_buffer import JitterBuffer
+from client.audio.mixer import Mixer
+from client.audio.ring_buffer import RingBuffer
+
+
+class PlaybackEngine:
+    """Qt'den bağımsız ses çalma motoru.
+
+    Ağ thread'i paketleri doğrudan receive_frame() ile jitter tamponlarına
+    koyar. Karıştırma thread'i her periyotta tek bir paket üretip sınırlı
+    halka tampona yazar, PyAudio callback'i de bu tampondan okur. Arayüz
+    thread'i bu yolun hiçbir noktasında yer almaz.
+    """
+
+    def __init__(self, p, rate, chunk, channels=1, buffered_frames=2):
+        self.p = p
+        self.RATE = rate
+        self.CHUNK = chunk
+        self.CHANNELS = channels
+        self.FRAME_MS = chunk * 1000 / rate
+
+        self.jitter_buffers = {}  # {gönderen indeksi: JitterBuffer}
+        self.mixer = Mixer(chunk)
+        # Callback'e en fazla buffered_frames periyotluk gecikme ekler
+        self.ring = RingBuffer(chunk * buffered_frames)
+
+        self.stream = None
+        self.running = False
+        self.mix_thread = None
+
+    def start(self):
+        """Callback modunda çıkış stream'ini ve karıştırma thread'ini başlat"""
+        if self.running:
+            return
+        self.running = True
+        self.ring.clear()
+        self.stream = self.p.open(
+            format=pyaudio.paFloat32,
+            channels=self.CHANNELS,
+            rate=self.RATE,
+            output=True,
+            frames_per_buffer=self.CHUNK,
+            stream_callback=self._callback
+        )
+        self.mix_thread = threading.Thread(target=self._mix_thread, daemon=True)
+        self.mix_thread.start()
+        self.stream.start_stream()
+
+    def stop(self):
+        """Stream'i ve karıştırma thread'ini durdur"""
+        self.running = False
+        self.ring.clear()  # Yer bekleyen yazarı uyandır
+        if self.mix_thread and self.mix_thread.is_alive():
+            self.mix_thread.join(timeout=1.0)
+        self.mix_thread = None
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        self.jitter_buffers.clear()
+
+    def receive_frame(self, frame):
+        """Ağ thread'inden çağrılır: paketi çözüp gönderenin tamponuna ekle"""
+        if not self.running:
+            return
+        samples = np.frombuffer(get_codec_by_id(frame.codec_id).decode(frame.payload), dtype=np.float32)
+        buffer = self.jitter_buffers.get(frame.sender)
+        if buffer is None:
+            buffer = self.jitter_buffers[frame.sender] = JitterBuffer(self.FRAME_MS)
+        buffer.push(frame.seq, frame.timestamp, samples)
+
+    def remove_sender(self, sender):
+        self.jitter_buffers.pop(sender, None)
+        self.mixer.remove(sender)
+
+    def clear_senders(self):
+        """Bütün gönderen tamponlarını bırak (kullanıcı kazançları korunur)"""
+        self.jitter_buffers.clear()
+
+    def get_stats(self):
+        """Gönderen başına tampon istatistikleri ve çıkış taşma/boşalma sayıları"""
+        return {
+            'senders': {sender: buffer.get_stats() for sender, buffer in list(self.jitter_buffers.items())},
+            'output_underruns': self.ring.underruns
+        }
+
+    def _mix_thread(self):
+        """Halka tamponda yer açıldıkça bir sonraki karışık paketi üret"""
+        while self.running:
+            frames = {}
+            for sender, buffer in list(self.jitter_buffers.items()):
+                samples = buffer.pop()
+                if samples is not None:
+                    frames[sender] = samples
+            mixed = self.mixer.mix(frames)
+            # Tampon doluysa ses kartı bir periyot tüketene kadar bekler
+            while self.running and not self.ring.write(mixed, timeout=0.1):
+                pass
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        """PyAudio ses thread'i: sadece halka tampondan kopyalar"""
+        return (self.ring.read(frame_count * self.CHANNELS).tobytes(), pyaudio.paContinue)
@@ -0,0 +1,55 @@
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    """Tek üretici / tek tüketici için sınırlı float32 halka tampon.
+
+    Üretici yer açılana kadar bekler, tüketici (ses kartı callback'i) ise
+    hiç beklemez: yeterli veri yoksa eksik kısmı sessizlikle doldurur.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.read_pos = 0
+        self.size = 0
+        self.underruns = 0
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return self.size
+
+    def write(self, samples, timeout=None):
+        """Örnekleri yaz; zaman aşımında False döner"""
+        count = len(samples)
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.capacity - self.size >= count, timeout):
+                return False
+            start = (self.read_pos + self.size) % self.capacity
+            first = min(count, self.capacity - start)
+            self.buffer[start:start + first] = samples[:first]
+            self.buffer[:count - first] = samples[first:]
+            self.size += count
+        return True
+
+    def read(self, count):
+        """count örnek oku; eksik kalan kısım sıfırla doldurulur"""
+        out = np.zeros(count, dtype=np.float32)
+        with self.condition:
+            available = min(count, self.size)
+            first = min(available, self.capacity - self.read_pos)
+            out[:first] = self.buffer[self.read_pos:self.read_pos + first]
+            out[first:available] = self.buffer[:available - first]
+            self.read_pos = (self.read_pos + available) % self.capacity
+            self.size -= available
+            if available < count:
+                self.underruns += 1
+            self.condition.notify()
+        return out
+
+    def clear(self):
+        with self.condition:
+            self.read_pos = 0
+            self.size = 0
+            self.condition.notify()
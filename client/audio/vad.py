@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def frame_energy_db(samples):
+    """Paketin ortalama enerjisi (dBFS)"""
+    energy = float(np.mean(samples * samples)) if len(samples) else 0.0
+    return 10 * np.log10(energy + 1e-12)
+
+
+class VoiceActivityDetector:
+    """Enerji ve sıfır geçiş oranına dayalı basit konuşma algılayıcı.
+
+    Gürültü tabanı sessiz paketlerden sürekli öğrenilir. Bir paket, enerjisi
+    hem mutlak eşiğin hem de gürültü tabanının belirgin üstündeyse ve sıfır
+    geçiş oranı tıslama/hışırtı gibi gürültülere özgü değerlerde değilse
+    konuşma sayılır. Konuşma bittikten sonra kelime sonlarının kesilmemesi
+    için `hangover_frames` paket boyunca etkin kalınır.
+    """
+
+    def __init__(self, threshold_db=-45.0, noise_margin_db=9.0, max_zcr=0.35, hangover_frames=8):
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.max_zcr = max_zcr
+        self.hangover_frames = hangover_frames
+
+        self.noise_db = threshold_db
+        self.hangover = 0
+        self.energy_db = -120.0  # Son paketin enerjisi (paket başlığındaki seviye alanı için)
+
+    def set_sensitivity(self, sensitivity):
+        """Ayarlar panelindeki 0-100 hassasiyeti eşiğe çevir (yüksek = daha hassas)"""
+        self.threshold_db = -25.0 - 0.4 * sensitivity
+
+    def is_speech(self, samples):
+        """Paket konuşma içeriyorsa (veya hangover sürüyorsa) True döner"""
+        energy_db = self.energy_db = frame_energy_db(samples)
+        signs = np.signbit(samples)
+        zcr = float(np.count_nonzero(signs[1:] != signs[:-1])) / max(1, len(samples) - 1)
+
+        loud = energy_db > max(self.threshold_db, self.noise_db + self.noise_margin_db)
+        # Yüksek sıfır geçişli paketler ancak çok güçlüyse konuşma sayılır
+        voiced = zcr < self.max_zcr or energy_db > self.noise_db + 2 * self.noise_margin_db
+
+        if loud and voiced:
+            self.hangover = self.hangover_frames
+            return True
+
+        # Sessiz paketlerle gürültü tabanını güncelle (yukarı yavaş, aşağı hızlı)
+        rate = 0.05 if energy_db > self.noise_db else 0.3
+        self.noise_db += (energy_db - self.noise_db) * rate
+
+        if self.hangover > 0:
+            self.hangover -= 1
+            return True
+        return False
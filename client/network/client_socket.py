@@ -1,20 +1,50 @@
+import queue
+import threading
 import socketio
 from PyQt6.QtCore import QObject, pyqtSignal
+from common.codec import get_codec, supported_codecs, DEFAULT_CODEC
+from common import protocol
 
 class ClientSocket(QObject):
     # Sinyaller
     connected = pyqtSignal()
     disconnected = pyqtSignal()
     message_received = pyqtSignal(str, str, str)  # username, message, timestamp
-    user_joined = pyqtSignal(str, str)  # username, room
-    user_left = pyqtSignal(str, str)    # username, room
-    audio_received = pyqtSignal(bytes)  # Yeni sinyal
+    # oda, katılan/güncellenen [{'id', 'username'}], ayrılan [{'id', 'username'}]
+    presence_changed = pyqtSignal(str, list, list)
+    room_moved = pyqtSignal(str)  # Oda başka bir server'a taşındı; yeniden katılınmalı
+    active_speakers_changed = pyqtSignal(str, list)  # oda, sesi iletilen üye kimlikleri
+    audio_mode_changed = pyqtSignal(str, str)  # oda, 'forward' ya da 'mix'
+    room_created = pyqtSignal(str)  # Server'a yeni oda eklendi
+    room_deleted = pyqtSignal(str)  # Server'dan oda silindi
     
     def __init__(self):
         super().__init__()
         self.sio = socketio.Client()
         self.setup_events()
+        self.server_url = None
+        self.username = None  # Başka server'a geçerken yeniden giriş için
         self.current_room = None
+        self.codec = DEFAULT_CODEC  # Odaya katılırken server ile belirlenir
+        self.audio_mode = 'forward'  # Karıştırma modunda ses tek akış olarak gelir (gönderen 0)
+        
+        # İkili ses paketleri için server'ın atadığı kimlikler
+        self.stream_id = None
+        self.sender_id = None
+        self.sender_names = {}  # Odadaki üyeler: {gönderen indeksi: kullanıcı adı}
+        self.presence_version = 0  # sender_names'in server'daki hangi sürüme karşılık geldiği
+        self.active_speakers = []  # Server'ın seçtiği etkin konuşmacılar (üye kimlikleri)
+        self.seq = 0
+        self.audio_stats = {}  # {gönderen indeksi: protocol.StreamStats}
+        
+        # Ses paketleri Qt olay döngüsüne uğramadan doğrudan buraya verilir
+        self.audio_sink = None
+        
+        # Mikrofondan gelen paketler için gönderim kuyruğu (~190ms)
+        self.send_queue = queue.Queue(maxsize=8)
+        self.send_drops = 0
+        self.send_thread = threading.Thread(target=self._send_thread, daemon=True)
+        self.send_thread.start()
         
     def setup_events(self):
         @self.sio.event
@@ -36,50 +66,219 @@ class ClientSocket(QObject):
                 data['timestamp']
             )
             
-        @self.sio.on('user_joined')
-        def on_user_joined(data):
-            print(f"Kullanıcı katıldı: {data}")  # Debug
-            self.user_joined.emit(data['username'], data['room'])
+        @self.sio.on('presence_delta')
+        def on_presence_delta(data):
+            if data['room'] != self.current_room or data['version'] <= self.presence_version:
+                return  # Başka oda ya da zaten uygulanmış değişiklik
+            if data['from_version'] > self.presence_version:
+                # Arada kaçırılan değişiklik var: tam listeyi yeniden iste
+                self.sio.start_background_task(self.resync_presence)
+                return
+            # Kayıtlar o sürümdeki son durumu bildirir, tekrar uygulamak zararsızdır
+            left = [{'id': member_id, 'username': self.sender_names.pop(member_id)}
+                    for member_id in data['left'] if member_id in self.sender_names]
+            for member in data['joined']:
+                self.sender_names[member['id']] = member['username']
+            self.presence_version = data['version']
+            self.presence_changed.emit(data['room'], data['joined'], left)
             
-        @self.sio.on('user_left')
-        def on_user_left(data):
-            print(f"Kullanıcı ayrıldı: {data}")  # Debug
-            self.user_left.emit(data['username'], data['room'])
+        @self.sio.on('audio_mode')
+        def on_audio_mode(data):
+            if data['room'] == self.current_room and data['mode'] != self.audio_mode:
+                self.audio_mode = data['mode']
+                self.audio_stats.clear()
+                self.audio_mode_changed.emit(data['room'], data['mode'])
+
+        @self.sio.on('active_speakers')
+        def on_active_speakers(data):
+            if data['room'] == self.current_room:
+                self.active_speakers = data['speakers']
+                self.active_speakers_changed.emit(data['room'], data['speakers'])
+            
+        @self.sio.on('room_created')
+        def on_room_created(data):
+            self.room_created.emit(data['room'])
+
+        @self.sio.on('room_deleted')
+        def on_room_deleted(data):
+            self.room_deleted.emit(data['room'])
+
+        @self.sio.on('room_moved')
+        def on_room_moved(data):
+            # Küme modunda oda başka bir server'a devredildi
+            if data['room'] == self.current_room:
+                self.sio.start_background_task(self.follow_room, data['room'], data['url'])
         
         @self.sio.on('audio_data')
         def on_audio_data(data):
-            self.audio_received.emit(data['audio'])
+            frame = protocol.unpack_frame(data)
+            stats = self.audio_stats.get(frame.sender)
+            if stats is None:
+                stats = self.audio_stats[frame.sender] = protocol.StreamStats()
+            stats.update(frame)
+            # Kendi sesimiz server tarafından zaten filtreleniyor
+            if self.audio_sink and frame.stream_id == self.stream_id and frame.payload:
+                self.audio_sink(frame)
     
     def connect_to_server(self, url='http://129.159.223.71:8080'):
         try:
-            self.sio.connect(url)
+            # Doğrudan WebSocket: çok süreçli server'da bağlantı tek worker'da kalır
+            self.sio.connect(url, transports=['websocket'])
+            self.server_url = url
             return True
         except Exception as e:
             print(f"Bağlantı hatası: {e}")
             return False
             
     def login(self, username):
+        self.username = username
         return self.sio.call('login', username)
         
+    def move_to(self, url):
+        """Küme içinde başka bir server'a geç ve yeniden giriş yap"""
+        if url == self.server_url:
+            return True
+        print(f"Server değiştiriliyor: {url}")
+        self.disconnect_from_server()
+        if not self.connect_to_server(url):
+            return False
+        if self.username is not None:
+            self.login(self.username)
+        return True
+        
+    def follow_room(self, room_name, url):
+        """Taşınan odanın yeni server'ına geç; katılma işini arayüz yapar"""
+        self.current_room = None
+        self.stream_id = None
+        if self.move_to(url):
+            self.room_moved.emit(room_name)
+        
     def join_room(self, room_name):
         """Odaya katıl ve yanıtı bekle"""
         try:
             print(f"Odaya katılma isteği gönderiliyor: {room_name}")  # Debug için
-            response = self.sio.call('join_room', room_name)
+            request = {
+                'room': room_name,
+                'codecs': supported_codecs()  # Desteklediğimiz codec'ler (tercih sırasına göre)
+            }
+            response = self.sio.call('join_room', request)
+            if response and response.get('status') == 'redirect':
+                # Oda küme içinde başka bir server'da: oraya geçip bir kez daha dene
+                if not self.move_to(response['url']):
+                    return {'status': 'error', 'message': 'Odanın server\'ına bağlanılamadı'}
+                response = self.sio.call('join_room', {**request, 'redirected': True})
             print(f"Server yanıtı: {response}")  # Debug için
             
             if response and response.get('status') == 'success':
                 self.current_room = room_name
+                self.codec = response.get('codec', DEFAULT_CODEC)
+                self.stream_id = response['stream_id']
+                self.sender_id = response['sender_id']
+                presence = response['presence']
+                self.sender_names = {member['id']: member['username'] for member in presence['members']}
+                self.presence_version = presence['version']
+                self.active_speakers = response.get('speakers', {}).get('speakers', [])
+                self.audio_mode = response.get('audio_mode', 'forward')
+                self.audio_stats.clear()
                 print(f"Başarıyla katıldı: {room_name}")  # Debug için
             return response
         except Exception as e:
             print(f"Odaya katılma hatası: {e}")  # Debug için
             return {'status': 'error', 'message': str(e)}
         
+    def resync_presence(self):
+        """Üye listesini server'dan yeniden al ve farkları bildir"""
+        try:
+            response = self.sio.call('presence_snapshot', {})
+        except Exception as e:
+            print(f"Üye listesi alınamadı: {e}")
+            return
+        if not response or response.get('status') != 'success' or response['room'] != self.current_room:
+            return
+        presence = response['presence']
+        members = {member['id']: member['username'] for member in presence['members']}
+        joined = [member for member in presence['members']
+                  if self.sender_names.get(member['id']) != member['username']]
+        left = [{'id': member_id, 'username': username}
+                for member_id, username in self.sender_names.items() if member_id not in members]
+        self.sender_names = members
+        self.presence_version = presence['version']
+        self.presence_changed.emit(response['room'], joined, left)
+        
+    def set_speaker_priority(self, member_id, priority=True):
+        """Üyenin sesi konuşmacı sıralamasına bakılmadan herkese iletilsin (ya da iletilmesin)"""
+        try:
+            return self.sio.call('set_speaker_priority', {'member_id': member_id, 'priority': priority})
+        except Exception as e:
+            print(f"Öncelik ayarlama hatası: {e}")
+            return {'status': 'error', 'message': str(e)}
+
+    def set_audio_mode(self, mode, room=None):
+        """Odanın sesi server'da karıştırılsın ('mix') ya da ayrı ayrı iletilsin ('forward')"""
+        try:
+            return self.sio.call('set_audio_mode', {'room': room or self.current_room, 'mode': mode})
+        except Exception as e:
+            print(f"Ses modu değiştirme hatası: {e}")
+            return {'status': 'error', 'message': str(e)}
+
+    def fetch_history(self, cursor, limit=50):
+        """İmleçten daha eski mesajların bir sayfasını iste"""
+        try:
+            return self.sio.call('fetch_history', {
+                'room': self.current_room,
+                'cursor': cursor,
+                'limit': limit
+            })
+        except Exception as e:
+            print(f"Geçmiş yükleme hatası: {e}")
+            return None
+        
+    def search_messages(self, query, room_name=None, limit=20, offset=0):
+        """Mesajlarda tam metin arama (room_name verilmezse tüm odalarda)"""
+        try:
+            return self.sio.call('search_messages', {
+                'query': query,
+                'room': room_name,
+                'limit': limit,
+                'offset': offset
+            })
+        except Exception as e:
+            print(f"Arama hatası: {e}")
+            return None
+        
+    def list_rooms(self, prefix='', limit=200, offset=0):
+        """Server'daki odaları iste (isteğe bağlı önek filtresi ile)"""
+        try:
+            return self.sio.call('list_rooms', {
+                'prefix': prefix,
+                'limit': limit,
+                'offset': offset
+            })
+        except Exception as e:
+            print(f"Oda listesi hatası: {e}")
+            return None
+        
+    def create_room(self, room_name):
+        """Yeni oda oluştur"""
+        try:
+            return self.sio.call('create_room', {'room': room_name})
+        except Exception as e:
+            print(f"Oda oluşturma hatası: {e}")
+            return {'status': 'error', 'message': str(e)}
+        
+    def delete_room(self, room_name):
+        """Boş odayı sil"""
+        try:
+            return self.sio.call('delete_room', {'room': room_name})
+        except Exception as e:
+            print(f"Oda silme hatası: {e}")
+            return {'status': 'error', 'message': str(e)}
+        
     def leave_room(self, room_name):
         if self.current_room:
             self.sio.emit('leave_room', room_name)
             self.current_room = None
+            self.stream_id = None
             
     def send_message(self, message):
         """Mesaj gönder"""
@@ -94,10 +293,46 @@ class ClientSocket(QObject):
         if self.sio.connected:
             self.sio.disconnect()
 
-    def send_audio(self, audio_data):
-        """Ses verisini server'a gönder"""
-        if self.current_room:
-            self.sio.emit('audio_data', {
-                'room': self.current_room,
-                'audio': audio_data
-            })
+    def enqueue_audio(self, audio_data, timestamp, flags=0, level=protocol.LEVEL_SILENT):
+        """Kayıt thread'inden çağrılır; kuyruk doluysa en eski paketi at"""
+        while True:
+            try:
+                self.send_queue.put_nowait((audio_data, timestamp, flags, level))
+                return
+            except queue.Full:
+                try:
+                    self.send_queue.get_nowait()
+                    self.send_drops += 1
+                except queue.Empty:
+                    pass
+                    
+    def _send_thread(self):
+        """Gönderim kuyruğunu tüketip paketleri server'a ileten thread"""
+        while True:
+            audio_data, timestamp, flags, level = self.send_queue.get()
+            try:
+                if self.sio.connected:
+                    self.send_audio(audio_data, timestamp, flags, level)
+            except Exception as e:
+                print(f"Ses gönderme hatası: {e}")
+            
+    def send_audio(self, audio_data, timestamp=None, flags=0, level=protocol.LEVEL_SILENT):
+        """Kodlanmış ses verisini ikili paket olarak server'a gönder"""
+        if self.current_room and self.stream_id is not None:
+            if timestamp is None:
+                timestamp = protocol.now_ms()
+            frame = protocol.pack_frame(
+                self.stream_id,
+                self.sender_id,
+                self.seq,
+                timestamp,
+                get_codec(self.codec).codec_id,
+                audio_data,
+                flags,
+                level
+            )
+            # Sessizlik işaretçileri sıra numarası tüketmez, böylece
+            # karşı taraf atlanan paketleri kayıp saymaz
+            if not flags & protocol.FLAG_SILENCE:
+                self.seq = (self.seq + 1) % protocol.SEQ_MODULO
+            self.sio.emit('audio_data', frame)
@@ -1,12 +1,12 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QPushButton, QLabel, QListWidget, QTextEdit)
-from PyQt6.QtCore import Qt, QTimer, QSize
+from PyQt6.QtCore import Qt, QSize
 from client.network.client_socket import ClientSocket
 from client.audio.audio_manager import AudioManager
 from client.ui.settings_window import SettingsPanel
 import numpy as np
 from datetime import datetime
-from PyQt6.QtGui import QIcon
+from PyQt6.QtGui import QIcon, QTextCursor
 from PyQt6.QtCore import QEvent
 from pathlib import Path
 
@@ -21,9 +21,9 @@ class MainWindow(QMainWindow):
         self.is_muted = False
         self.current_user_label = None
         
-        # Ses durumu için timer
-        self.voice_timer = QTimer()
-        self.voice_timer.timeout.connect(self.reset_voice_indicator)
+        # Eski mesajları sayfa sayfa yüklemek için imleç (None = geçmiş bitti)
+        self.history_cursor = None
+        self.loading_history = False
         
         # Önce UI'ı oluştur
         self.init_ui()
@@ -91,9 +91,9 @@ class MainWindow(QMainWindow):
         self.channels_layout.setSpacing(2)
         self.channels_layout.setContentsMargins(8, 0, 8, 0)
         
-        # Her kanal için widget ve kullanıcı listesi oluştur
+        # Her kanal için widget ve kullanıcı listesi (kanallar girişten sonra
+        # server'dan yüklenir)
         self.channel_widgets = {}
-        self.init_channel_widgets()
         
         # Sağ panel (sohbet)
         right_panel = QWidget()
@@ -114,6 +114,8 @@ class MainWindow(QMainWindow):
                 font-size: 14px;
             }
         """)
+        # En üste kaydırıldığında daha eski mesajları yükle
+        self.chat_area.verticalScrollBar().valueChanged.connect(self.handle_chat_scroll)
         
         # Mesaj gönderme alanı
         message_panel = QWidget()
@@ -192,101 +194,129 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(left_panel)
         main_layout.addWidget(right_panel)
         
-    def init_channel_widgets(self):
-        for channel in ["Genel Sohbet", "Oyun Odası", "Müzik Odası"]:
-            # Kanal container
-            channel_container = QWidget()
-            channel_layout = QVBoxLayout(channel_container)
-            channel_layout.setSpacing(0)
-            channel_layout.setContentsMargins(0, 0, 0, 0)
-            
-            # Kanal başlığı container'ı
-            header_container = QWidget()
-            header_layout = QHBoxLayout(header_container)
-            header_layout.setSpacing(4)
-            header_layout.setContentsMargins(8, 4, 8, 4)
-            
-            # Kanal butonu
-            channel_button = QPushButton(f"🔊 {channel}")
-            channel_button.setStyleSheet("""
-                QPushButton {
-                    text-align: left;
-                    padding: 8px;
-                    background-color: transparent;
-                    color: #8e9297;
-                    border: none;
-                    border-radius: 4px;
-                }
-                QPushButton:hover {
-                    background-color: #36393f;
-                    color: #dcddde;
-                }
-                QPushButton[active="true"] {
-                    background-color: #42464D;
-                    color: white;
-                }
-            """)
-            channel_button.clicked.connect(lambda checked, name=channel: self.join_channel(name))
-            
-            # Ayrıl butonu
-            leave_button = QPushButton()
-            leave_button.setIcon(QIcon("client/assets/leave.png"))
-            leave_button.setFixedSize(24, 24)
-            leave_button.setStyleSheet("""
-                QPushButton {
-                    background-color: transparent;
-                    border: none;
-                }
-                QPushButton:hover {
-                    background-color: #36393f;
-                    border-radius: 4px;
-                }
-            """)
-            leave_button.clicked.connect(lambda checked, name=channel: self.leave_channel(name))
-            leave_button.hide()
-            
-            header_layout.addWidget(channel_button)
-            header_layout.addWidget(leave_button)
-            
-            channel_layout.addWidget(header_container)
-            
-            # Kullanıcı listesi widget'ı
-            users_container = QWidget()
-            users_container.setStyleSheet("""
-                QWidget {
-                    background-color: transparent;
-                }
-            """)
-            users_layout = QVBoxLayout(users_container)
-            users_layout.setSpacing(2)
-            users_layout.setContentsMargins(20, 0, 0, 0)  # Sol margin için
-            
-            channel_layout.addWidget(users_container)
-            
-            # Kanal bilgilerini sakla
-            self.channel_widgets[channel] = {
-                'container': channel_container,
-                'button': channel_button,
-                'leave_button': leave_button,
-                'users_container': users_container,
-                'users_layout': users_layout,
-                'users': {}
+    def load_channels(self):
+        """Server'daki odaları sayfa sayfa alıp kanal listesini oluştur"""
+        offset = 0
+        while offset is not None:
+            response = self.socket.list_rooms(offset=offset)
+            if not response or response.get('status') != 'success':
+                return
+            for room in response['rooms']:
+                self.add_channel_widget(room['name'])
+            offset = response['next_offset']
+
+    def add_channel_widget(self, channel):
+        """Kanal için widget ve kullanıcı listesi oluştur (liste adına göre sıralı)"""
+        if channel in self.channel_widgets:
+            return
+        # Kanal container
+        channel_container = QWidget()
+        channel_layout = QVBoxLayout(channel_container)
+        channel_layout.setSpacing(0)
+        channel_layout.setContentsMargins(0, 0, 0, 0)
+        
+        # Kanal başlığı container'ı
+        header_container = QWidget()
+        header_layout = QHBoxLayout(header_container)
+        header_layout.setSpacing(4)
+        header_layout.setContentsMargins(8, 4, 8, 4)
+        
+        # Kanal butonu
+        channel_button = QPushButton(f"🔊 {channel}")
+        channel_button.setStyleSheet("""
+            QPushButton {
+                text-align: left;
+                padding: 8px;
+                background-color: transparent;
+                color: #8e9297;
+                border: none;
+                border-radius: 4px;
             }
-            
-            self.channels_layout.addWidget(channel_container)
+            QPushButton:hover {
+                background-color: #36393f;
+                color: #dcddde;
+            }
+            QPushButton[active="true"] {
+                background-color: #42464D;
+                color: white;
+            }
+        """)
+        channel_button.clicked.connect(lambda checked, name=channel: self.join_channel(name))
+        
+        # Ayrıl butonu
+        leave_button = QPushButton()
+        leave_button.setIcon(QIcon("client/assets/leave.png"))
+        leave_button.setFixedSize(24, 24)
+        leave_button.setStyleSheet("""
+            QPushButton {
+                background-color: transparent;
+                border: none;
+            }
+            QPushButton:hover {
+                background-color: #36393f;
+                border-radius: 4px;
+            }
+        """)
+        leave_button.clicked.connect(lambda checked, name=channel: self.leave_channel(name))
+        leave_button.hide()
+        
+        header_layout.addWidget(channel_button)
+        header_layout.addWidget(leave_button)
+        
+        channel_layout.addWidget(header_container)
+        
+        # Kullanıcı listesi widget'ı
+        users_container = QWidget()
+        users_container.setStyleSheet("""
+            QWidget {
+                background-color: transparent;
+            }
+        """)
+        users_layout = QVBoxLayout(users_container)
+        users_layout.setSpacing(2)
+        users_layout.setContentsMargins(20, 0, 0, 0)  # Sol margin için
+        
+        channel_layout.addWidget(users_container)
+        
+        # Kanal bilgilerini sakla
+        self.channel_widgets[channel] = {
+            'container': channel_container,
+            'button': channel_button,
+            'leave_button': leave_button,
+            'users_container': users_container,
+            'users_layout': users_layout,
+            'users': {}
+        }
+        
+        self.channels_layout.insertWidget(sorted(self.channel_widgets).index(channel), channel_container)
+
+    def remove_channel_widget(self, channel):
+        """Silinen kanalın widget'larını kaldır"""
+        if self.socket.current_room == channel:
+            self.leave_channel(channel)
+        ch_widgets = self.channel_widgets.pop(channel, None)
+        if ch_widgets is not None:
+            self.channels_layout.removeWidget(ch_widgets['container'])
+            ch_widgets['container'].deleteLater()
 
     def setup_socket(self):
         """Socket sinyallerini bağla"""
         self.socket.message_received.connect(self.handle_message)
-        self.socket.user_joined.connect(self.handle_user_joined)
-        self.socket.user_left.connect(self.handle_user_left)
-        self.socket.audio_received.connect(self.handle_received_audio)
+        self.socket.presence_changed.connect(self.handle_presence_changed)
+        self.socket.room_moved.connect(self.handle_room_moved)
+        self.socket.active_speakers_changed.connect(self.handle_active_speakers)
+        self.socket.audio_mode_changed.connect(self.handle_audio_mode)
+        self.socket.room_created.connect(self.add_channel_widget)
+        self.socket.room_deleted.connect(self.remove_channel_widget)
+        # Gelen ses GUI thread'ine uğramadan çalma motoruna gider
+        self.socket.audio_sink = self.audio_manager.receive_frame
         
     def connect_to_server(self):
         if self.socket.connect_to_server():
             response = self.socket.login(self.username)
             if response['status'] == 'success':
                 print("Giriş başarılı!")
+                self.load_channels()
                 
     def join_channel(self, channel_name):
         """Kanala katıl"""
@@ -298,6 +328,9 @@ class MainWindow(QMainWindow):
         print(f"[DEBUG] Join response: {response}")
         
         if response and response.get('status') == 'success':
+            # Server ile anlaşılan codec'i kullan
+            self.audio_manager.set_codec(self.socket.codec)
+            
             # Kanal butonlarını güncelle
             for ch_name, ch_widgets in self.channel_widgets.items():
                 ch_widgets['button'].setProperty('active', ch_name == channel_name)
@@ -312,34 +345,22 @@ class MainWindow(QMainWindow):
                     ch_widgets['users'].clear()
                     
                     # Kendimizi ekle
-                    user_label = QLabel(f"👤 {self.username}")
-                    user_label.setStyleSheet("""
-                        color: #dcddde;
-                        padding: 4px 8px 4px 8px;
-                        font-size: 14px;
-                    """)
-                    ch_widgets['users'][self.username] = user_label
-                    ch_widgets['users_layout'].addWidget(user_label)
-                    self.current_user_label = user_label
+                    self.current_user_label = self.add_user_label(
+                        ch_widgets, self.socket.sender_id, self.username)
                     
-                    # Diğer kullanıcıları ekle
-                    if 'users' in response:
-                        for username in response['users']:
-                            if username != self.username:
-                                user_label = QLabel(f"👤 {username}")
-                                user_label.setStyleSheet("""
-                                    color: #dcddde;
-                                    padding: 4px 8px 4px 8px;
-                                    font-size: 14px;
-                                """)
-                                ch_widgets['users'][username] = user_label
-                                ch_widgets['users_layout'].addWidget(user_label)
+                    # Diğer kullanıcıları ekle (etiketler üye kimliğiyle tutulur)
+                    for member_id, username in list(self.socket.sender_names.items()):
+                        if member_id != self.socket.sender_id:
+                            self.add_user_label(ch_widgets, member_id, username)
+                    self.handle_active_speakers(channel_name, self.socket.active_speakers)
                     
                     ch_widgets['users_container'].show()
                 else:
                     ch_widgets['users_container'].hide()
             
-            # Chat alanını temizle ve bilgi mesajı göster
+            # Chat alanını temizle ve bilgi mesajı göster; temizlik kaydırma
+            # olayı tetikleyebilir, önceki odanın imleciyle sayfa istenmesin
+            self.history_cursor = None
             self.chat_area.clear()
             self.chat_area.append(f"<i>{channel_name} kanalına katıldınız.</i>")
             
@@ -349,6 +370,7 @@ class MainWindow(QMainWindow):
                     self.chat_area.append(
                         f"[{msg['timestamp']}] <b>{msg['username']}:</b> {msg['message']}"
                     )
+            self.history_cursor = response.get('history_cursor')
             
             # Ses kaydını başlat
             if not self.is_muted:
@@ -370,10 +392,10 @@ class MainWindow(QMainWindow):
                 ch_widgets['users_container'].hide()
                 
                 # Kullanıcı listesini temizle
-                for username, user_label in list(ch_widgets['users'].items()):
+                for member_id, user_label in list(ch_widgets['users'].items()):
                     ch_widgets['users_layout'].removeWidget(user_label)
                     user_label.deleteLater()
-                    del ch_widgets['users'][username]
+                    del ch_widgets['users'][member_id]
                 self.current_user_label = None
             
             # Ses kaydını durdur
@@ -419,48 +441,96 @@ class MainWindow(QMainWindow):
         scrollbar = self.chat_area.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
         
-    def handle_user_joined(self, username, room):
-        """Kullanıcı kanala katıldığında"""
-        print(f"\n[DEBUG] User joined event - username: {username}, room: {room}")
-        print(f"[DEBUG] Current room: {self.socket.current_room}")
-        
-        if room == self.socket.current_room and username != self.username:
-            print(f"[DEBUG] Adding user to channel: {username}")
-            self.chat_area.append(f"<i>{username} kanala katıldı</i>")
+    def handle_chat_scroll(self, value):
+        """Sohbet alanı en üste kaydırılınca bir önceki sayfayı yükle"""
+        if value == self.chat_area.verticalScrollBar().minimum():
+            self.load_older_messages()
             
-            if room in self.channel_widgets:
-                ch_widgets = self.channel_widgets[room]
-                if username not in ch_widgets['users']:
-                    user_label = QLabel(f"👤 {username}")
-                    user_label.setStyleSheet("""
-                        color: #dcddde;
-                        padding: 4px 8px 4px 8px;
-                        font-size: 14px;
-                    """)
-                    ch_widgets['users'][username] = user_label
-                    ch_widgets['users_layout'].addWidget(user_label)
-                    ch_widgets['users_container'].show()
-                    print(f"[DEBUG] Added user label for: {username}")
-                    print(f"[DEBUG] Current users in widget: {list(ch_widgets['users'].keys())}")
+    def load_older_messages(self):
+        """Server'dan daha eski mesajları alıp sohbet alanının başına ekle"""
+        if not self.history_cursor or self.loading_history or not self.socket.current_room:
+            return
+        self.loading_history = True
+        try:
+            response = self.socket.fetch_history(self.history_cursor)
+            if not response or response.get('status') != 'success':
+                return
+            self.history_cursor = response.get('cursor')
+            
+            scrollbar = self.chat_area.verticalScrollBar()
+            old_maximum = scrollbar.maximum()
+            
+            # Mesajlar yeniden eskiye geliyor; her biri en başa eklenir
+            cursor = QTextCursor(self.chat_area.document())
+            for msg in response['messages']:
+                cursor.movePosition(QTextCursor.MoveOperation.Start)
+                cursor.insertHtml(f"[{msg['timestamp']}] <b>{msg['username']}:</b> {msg['message']}")
+                cursor.insertBlock()
+            
+            # Kullanıcının baktığı yer kaymasın
+            scrollbar.setValue(scrollbar.maximum() - old_maximum)
+        finally:
+            self.loading_history = False
+        
+    def add_user_label(self, ch_widgets, member_id, username):
+        """Kullanıcı listesine tek bir etiket ekle (varsa sadece adını güncelle)"""
+        user_label = ch_widgets['users'].get(member_id)
+        if user_label is not None:
+            user_label.setText(f"👤 {username}")
+            return user_label
+        user_label = QLabel(f"👤 {username}")
+        user_label.setStyleSheet("""
+            color: #dcddde;
+            padding: 4px 8px 4px 8px;
+            font-size: 14px;
+        """)
+        ch_widgets['users'][member_id] = user_label
+        ch_widgets['users_layout'].addWidget(user_label)
+        return user_label
 
-    def handle_user_left(self, username, room):
-        """Kullanıcı kanaldan ayrıldığında"""
-        print(f"User left: {username} from room: {room}")  # Debug için
-        if room == self.socket.current_room:
-            self.chat_area.append(f"<i>{username} kanaldan ayrıldı</i>")
-            # Kullanıcıyı listeden kaldır
-            if room in self.channel_widgets:
-                ch_widgets = self.channel_widgets[room]
-                if username in ch_widgets['users']:
-                    user_label = ch_widgets['users'][username]
-                    ch_widgets['users_layout'].removeWidget(user_label)
-                    user_label.deleteLater()
-                    del ch_widgets['users'][username]
+    def handle_room_moved(self, room):
+        """Oda başka bir server'a taşındı; bağlantı oraya geçti, yeniden katıl"""
+        self.join_channel(room)
+
+    def handle_presence_changed(self, room, joined, left):
+        """Üyelik değişikliklerini listeye uygula; sadece değişen etiketlere dokunulur"""
+        if room != self.socket.current_room or room not in self.channel_widgets:
+            return
+        ch_widgets = self.channel_widgets[room]
+        
+        for member in left:
+            # Ayrılanın jitter tamponu ve kazancı çalma motorunda kalmasın
+            self.audio_manager.remove_sender(member['id'])
+            user_label = ch_widgets['users'].pop(member['id'], None)
+            if user_label is not None:
+                ch_widgets['users_layout'].removeWidget(user_label)
+                user_label.deleteLater()
+        
+        # Yeniden bağlananlar (eski kimlik yerine yeni kimlik) bildirilmez
+        replaced = {member['replaces'] for member in joined if 'replaces' in member}
+        left_members = [member for member in left if member['id'] not in replaced]
+        new_members = [member for member in joined
+                       if 'replaces' not in member
+                       and member['id'] != self.socket.sender_id and member['id'] not in ch_widgets['users']]
+        for member in joined:
+            if member['id'] != self.socket.sender_id:
+                self.add_user_label(ch_widgets, member['id'], member['username'])
+        
+        # Kalabalık katılımlarda sohbeti satırlarla doldurma
+        if len(new_members) + len(left_members) <= 3:
+            for member in new_members:
+                self.chat_area.append(f"<i>{member['username']} kanala katıldı</i>")
+            for member in left_members:
+                self.chat_area.append(f"<i>{member['username']} kanaldan ayrıldı</i>")
+        else:
+            self.chat_area.append(
+                f"<i>{len(new_members)} kullanıcı katıldı, {len(left_members)} kullanıcı ayrıldı</i>")
 
     def setup_audio(self):
         """Ses yönetimi için gerekli bağlantıları kur"""
-        # Ses verisi hazır olduğunda server'a gönder
-        self.audio_manager.audio_data_ready.connect(self.handle_audio_data)
+        # Ses verisi kayıt thread'inden doğrudan ağ kuyruğuna gider; kimin
+        # konuştuğu server'ın active_speakers olaylarıyla gösterilir
+        self.audio_manager.capture_sink = self.socket.enqueue_audio
         
         # Başlangıç durumları
         self.is_muted = False  # Mikrofon açık başlar
@@ -508,31 +578,19 @@ class MainWindow(QMainWindow):
         self.audio_manager.start_recording()
         self.audio_manager.start_playback()
 
-    def handle_audio_data(self, audio_data):
-        """Mikrofondan gelen ses verisini server'a gönder"""
-        if self.socket.current_room:
-            self.socket.send_audio(audio_data)
-            # Ses iletilirken kullanıcı adını yeşil yap
-            if hasattr(self, 'current_user_label') and self.current_user_label:
-                self.current_user_label.setStyleSheet("color: #43b581;")  # Yeşil renk
-                self.voice_timer.start(100)  # 100ms sonra rengi normale döndür
+    def handle_audio_mode(self, room, mode):
+        """Oda karıştırma moduna geçti ya da çıktı: ses artık başka gönderen(ler)den gelir"""
+        if room == self.socket.current_room:
+            self.audio_manager.clear_senders()
+            self.chat_area.append(f"<i>Ses modu: {'server karıştırması' if mode == 'mix' else 'doğrudan iletim'}</i>")
 
-    def handle_received_audio(self, audio_data):
-        """Server'dan gelen ses verisini çal"""
-        if self.socket.current_room:
-            try:
-                # Eğer audio_data bir dictionary ise
-                if isinstance(audio_data, dict):
-                    sender_sid = audio_data.get('sender_sid')
-                    audio = audio_data.get('audio')
-                    if sender_sid and sender_sid != self.socket.sio.sid and audio:
-                        self.audio_manager.play_audio(audio)
-                # Eğer audio_data doğrudan bytes ise
-                elif isinstance(audio_data, bytes):
-                    # Kendi sesimizi server üzerinden filtreleyeceğiz
-                    self.audio_manager.play_audio(audio_data)
-            except Exception as e:
-                print(f"Ses verisi işleme hatası: {e}")
+    def handle_active_speakers(self, room, speakers):
+        """Sesi iletilen kullanıcıların adını yeşil yap (kendimiz dahil)"""
+        if room != self.socket.current_room or room not in self.channel_widgets:
+            return
+        for member_id, user_label in self.channel_widgets[room]['users'].items():
+            color = "#43b581" if member_id in speakers else "#dcddde"  # Yeşil / normal renk
+            user_label.setStyleSheet(f"color: {color}; padding: 4px 8px 4px 8px; font-size: 14px;")
 
     def toggle_mute(self):
         """Mikrofon durumunu değiştir"""
@@ -578,6 +636,7 @@ class MainWindow(QMainWindow):
         if self.socket.current_room:
             current_room = self.socket.current_room
             self.socket.leave_room(current_room)
+            self.history_cursor = None  # İmleç sadece ayrılınan odaya aitti
             
             # Ses kaydını durdur
             self.audio_manager.stop_recording()
@@ -591,12 +650,6 @@ class MainWindow(QMainWindow):
                     ch_widgets['user_label'] = None
                 self.current_user_label = None
 
-    def reset_voice_indicator(self):
-        """Ses iletimi bitince kullanıcı adı rengini normale döndür"""
-        if hasattr(self, 'current_user_label') and self.current_user_label:
-            self.current_user_label.setStyleSheet("color: #dcddde;")  # Normal renk
-        self.voice_timer.stop()
-
     def eventFilter(self, obj, event):
         """Enter tuşuna basılınca mesaj gönder"""
         if obj == self.message_input and event.type() == QEvent.Type.KeyPress:
@@ -0,0 +1 @@
+# Boş __init__.py dosyası
@@ -0,0 +1,219 @@
+import struct
+from bisect import bisect_right
+
+import numpy as np
+
+# IMA ADPCM tabloları
+_STEP_TABLE = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41,
+    45, 50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190,
+    209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724,
+    796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272,
+    2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132,
+    7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500,
+    20350, 22385, 24623, 27086, 29794, 32767
+]
+_INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8]
+
+
+def _build_adpcm_tables():
+    """Her (adım indeksi, kod) çifti için önceden hesaplanan değerler.
+
+    Tahmine eklenecek işaretli fark ve sonraki adım indeksi `index << 4 | kod`
+    ile bulunur. Kodlayıcı için her indeksin 0-7 büyüklüklerine karşılık
+    gelen farkları da tutulur; en büyük sığan büyüklük bisect ile seçilir
+    (bit bit karşılaştırmayla aynı sonucu verir).
+    """
+    deltas = []
+    next_index = []
+    thresholds = []
+    for index, step in enumerate(_STEP_TABLE):
+        magnitudes = [(step >> 3) + (step if m & 4 else 0) + (step >> 1 if m & 2 else 0)
+                      + (step >> 2 if m & 1 else 0) for m in range(8)]
+        thresholds.append([value - (step >> 3) for value in magnitudes])
+        for code in range(16):
+            deltas.append(-magnitudes[code & 7] if code & 8 else magnitudes[code & 7])
+            next_index.append(min(88, max(0, index + _INDEX_TABLE[code & 7])))
+    return deltas, next_index, thresholds
+
+
+_DELTAS, _NEXT_INDEX, _THRESHOLDS = _build_adpcm_tables()
+
+
+def float_to_int16(samples):
+    """float32 örnekleri int16'ya çevir"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def int16_to_float(samples):
+    """int16 örnekleri float32'ye çevir"""
+    return samples.astype(np.float32) / 32767.0
+
+
+def soft_clip(samples, threshold=0.6):
+    """Eşiğin altındaki örneklere dokunmadan tepeleri yumuşakça ±1'e sıkıştır"""
+    magnitude = np.abs(samples)
+    knee = 1.0 - threshold
+    compressed = threshold + knee * np.tanh((magnitude - threshold) / knee)
+    return np.where(magnitude > threshold, np.sign(samples) * compressed, samples).astype(np.float32)
+
+
+class AudioCodec:
+    """Tüm codec'lerin ortak arayüzü.
+
+    encode() mikrofondan gelen ham paFloat32 baytlarını alır, decode() ise
+    hoparlöre yazılabilecek paFloat32 baytlarını döndürür.
+    """
+    name = None
+    codec_id = None
+
+    def encode(self, pcm_data):
+        raise NotImplementedError
+
+    def decode(self, payload):
+        raise NotImplementedError
+
+
+class Float32Codec(AudioCodec):
+    """Sıkıştırmasız ham float32 (eski istemcilerle uyumluluk için)"""
+    name = 'pcm_f32'
+    codec_id = 0
+
+    def encode(self, pcm_data):
+        return pcm_data
+
+    def decode(self, payload):
+        return payload
+
+
+class Pcm16Codec(AudioCodec):
+    """float32 -> int16 dönüşümü (2x küçülme)"""
+    name = 'pcm16'
+    codec_id = 1
+
+    def encode(self, pcm_data):
+        samples = np.frombuffer(pcm_data, dtype=np.float32)
+        return float_to_int16(samples).tobytes()
+
+    def decode(self, payload):
+        samples = np.frombuffer(payload, dtype=np.int16)
+        return int16_to_float(samples).tobytes()
+
+
+class AdpcmCodec(AudioCodec):
+    """Konuşma için düşük bit hızlı codec.
+
+    Örnekleme hızı `decimation` oranında düşürülür, ardından IMA ADPCM ile
+    örnek başına 4 bit kodlanır. Her paket kendi başlangıç durumunu taşıdığı
+    için kaybolan paketler sonraki paketlerin çözülmesini bozmaz.
+    Varsayılan ayarlarla 1024 örneklik bir float32 paket 4096 bayttan
+    261 bayta iner.
+    """
+    name = 'adpcm'
+    codec_id = 2
+
+    # örnek sayısı, başlangıç tahmini, adım indeksi
+    HEADER = struct.Struct('<HhB')
+
+    def __init__(self, decimation=2):
+        self.decimation = decimation
+
+    def encode(self, pcm_data):
+        samples = np.frombuffer(pcm_data, dtype=np.float32)
+        sample_count = len(samples)
+
+        # Basit alçak geçiren filtre + örnek seyreltme
+        usable = sample_count - sample_count % self.decimation
+        reduced = samples[:usable].reshape(-1, self.decimation).mean(axis=1)
+        pcm = float_to_int16(reduced).tolist()
+
+        predictor = pcm[0] if pcm else 0
+        # Başlangıç adımını paketin ortalama değişimine göre seç, böylece
+        # kodlayıcı her pakette sıfırdan ısınmak zorunda kalmaz
+        mean_diff = int(np.abs(np.diff(reduced)).mean() * 32767) if len(pcm) > 1 else 0
+        index = min(88, int(np.searchsorted(_STEP_TABLE, mean_diff)))
+        header = self.HEADER.pack(sample_count, predictor, index)
+
+        codes = bytearray((len(pcm) + 1) // 2)
+        for i, sample in enumerate(pcm):
+            diff = sample - predictor
+            if diff < 0:
+                code = 8 | bisect_right(_THRESHOLDS[index], -diff) - 1
+            else:
+                code = bisect_right(_THRESHOLDS[index], diff) - 1
+            key = index << 4 | code
+            predictor += _DELTAS[key]
+            if predictor > 32767:
+                predictor = 32767
+            elif predictor < -32768:
+                predictor = -32768
+            index = _NEXT_INDEX[key]
+
+            if i & 1:
+                codes[i >> 1] |= code << 4
+            else:
+                codes[i >> 1] = code
+
+        return header + bytes(codes)
+
+    def decode(self, payload):
+        if len(payload) < self.HEADER.size:
+            raise ValueError("ADPCM paketi eksik ya da bozuk")
+        sample_count, predictor, index = self.HEADER.unpack_from(payload)
+        reduced_count = sample_count // self.decimation
+        packed = np.frombuffer(payload, dtype=np.uint8, offset=self.HEADER.size)
+        if len(packed) < (reduced_count + 1) // 2 or index > 88:
+            raise ValueError("ADPCM paketi eksik ya da bozuk")
+
+        # Paket başına iki 4 bitlik kod: önce alt, sonra üst yarım bayt
+        codes = np.empty(len(packed) * 2, dtype=np.uint8)
+        codes[0::2] = packed & 0x0F
+        codes[1::2] = packed >> 4
+        pcm = [0] * reduced_count
+        for i, code in enumerate(codes[:reduced_count].tolist()):
+            key = index << 4 | code
+            predictor += _DELTAS[key]
+            if predictor > 32767:
+                predictor = 32767
+            elif predictor < -32768:
+                predictor = -32768
+            index = _NEXT_INDEX[key]
+            pcm[i] = predictor
+
+        reduced = int16_to_float(np.array(pcm, dtype=np.int16))
+        if reduced_count == 0:
+            return np.zeros(sample_count, dtype=np.float32).tobytes()
+
+        # Doğrusal aradeğerleme ile orijinal örnekleme hızına geri dön
+        positions = (np.arange(sample_count, dtype=np.float32) - (self.decimation - 1) / 2) / self.decimation
+        samples = np.interp(positions, np.arange(reduced_count), reduced).astype(np.float32)
+        return samples.tobytes()
+
+
+# Sunucunun tercih sırası: ilk sıradaki en düşük bant genişliğini kullanır
+CODECS = {codec.name: codec for codec in (AdpcmCodec(), Pcm16Codec(), Float32Codec())}
+CODECS_BY_ID = {codec.codec_id: codec for codec in CODECS.values()}
+DEFAULT_CODEC = Float32Codec.name
+
+
+def get_codec(name):
+    """İsme göre codec getir"""
+    return CODECS[name]
+
+
+def get_codec_by_id(codec_id):
+    """Paket başlığındaki kimliğe göre codec getir"""
+    return CODECS_BY_ID[codec_id]
+
+
+def supported_codecs():
+    """Desteklenen codec isimlerini tercih sırasına göre getir"""
+    return list(CODECS)
+
+
+def negotiate_codec(offered):
+    """İstemcinin sunduğu codec'lerden sunucunun en çok tercih ettiğini seç"""
+    for name in CODECS:
+        if name in (offered or []):
+            return name
+    return DEFAULT_CODEC
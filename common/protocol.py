@@ -0,0 +1,126 @@
+import struct
+import time
+from collections import namedtuple
+
+# İkili ses paketi başlığı (ağ bayt sırası, 13 bayt):
+#   stream_id  H  oda/yayın kimliği (server odaya 16 bitlik ayrı bir kimlik verir)
+#   sender     H  gönderen indeksi (server tarafından atanır)
+#   seq        H  sıra numarası (65535'ten sonra başa döner)
+#   timestamp  I  yakalama zamanı (ms, 32 bit)
+#   codec_id   B  common.codec kimliği
+#   flags      B  paket bayrakları
+#   level      B  ses seviyesi (-dBov, RFC 6464 gibi: 0 en yüksek, 127 sessiz)
+HEADER = struct.Struct('!HHHIBBB')
+SENDER = struct.Struct('!H')
+SENDER_OFFSET = 2
+FLAGS_OFFSET = 11
+LEVEL_OFFSET = 12
+
+LEVEL_SILENT = 127
+
+# Server'da karıştırılmış akışın gönderen indeksi (üyelere 1'den başlayarak indeks verilir)
+MIX_SENDER = 0
+
+# Bayraklar
+FLAG_SILENCE = 0x01  # Ses yok; yük, atlanan sessiz paket sayısını taşır (SILENCE)
+
+SILENCE = struct.Struct('!H')
+
+SEQ_MODULO = 1 << 16
+TIMESTAMP_MODULO = 1 << 32
+
+AudioFrame = namedtuple('AudioFrame', 'stream_id sender seq timestamp codec_id flags level payload')
+
+
+def now_ms():
+    """32 bitlik milisaniye zaman damgası"""
+    return int(time.time() * 1000) % TIMESTAMP_MODULO
+
+
+def pack_frame(stream_id, sender, seq, timestamp, codec_id, payload, flags=0, level=LEVEL_SILENT):
+    """Başlık ve yükü tek bir ikili pakette birleştir"""
+    return HEADER.pack(stream_id, sender, seq % SEQ_MODULO, timestamp % TIMESTAMP_MODULO,
+                       codec_id, flags, level) + payload
+
+
+def unpack_frame(data):
+    """İkili paketi AudioFrame'e çöz"""
+    return AudioFrame(*HEADER.unpack_from(data), data[HEADER.size:])
+
+
+def read_stream_id(data):
+    """Sadece oda kimliğini oku (server'ın yönlendirme için ihtiyacı olan tek alan)"""
+    return (data[0] << 8) | data[1]
+
+
+def read_sender(data):
+    """Sadece gönderen indeksini oku"""
+    return (data[SENDER_OFFSET] << 8) | data[SENDER_OFFSET + 1]
+
+
+def read_flags(data):
+    """Sadece bayrak alanını oku"""
+    return data[FLAGS_OFFSET]
+
+
+def read_level(data):
+    """Sadece ses seviyesi alanını oku"""
+    return data[LEVEL_OFFSET]
+
+
+def level_from_db(energy_db):
+    """Paket enerjisini (dBFS) başlıktaki seviye alanına çevir"""
+    return int(min(LEVEL_SILENT, max(0, round(-energy_db))))
+
+
+def pack_silence(suppressed):
+    """Sessizlik işaretçisinin yükü: son işaretçiden bu yana gönderilmeyen paket sayısı"""
+    return SILENCE.pack(min(suppressed, 0xFFFF))
+
+
+def stamp_sender(data, sender):
+    """Gönderen indeksini server'ın atadığı değerle değiştir"""
+    frame = bytearray(data)
+    SENDER.pack_into(frame, SENDER_OFFSET, sender)
+    return bytes(frame)
+
+
+def seq_diff(a, b):
+    """Başa dönmeyi hesaba katarak a - b sıra farkı"""
+    return (a - b + SEQ_MODULO // 2) % SEQ_MODULO - SEQ_MODULO // 2
+
+
+def elapsed_ms(timestamp, now=None):
+    """Zaman damgasından bu yana geçen süre (ms)"""
+    if now is None:
+        now = now_ms()
+    return (now - timestamp) % TIMESTAMP_MODULO
+
+
+class StreamStats:
+    """Bir gönderenden gelen paketler için kayıp ve gecikme sayaçları"""
+
+    def __init__(self):
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.latency_ms = 0.0
+        self.last_seq = None
+
+    def update(self, frame, arrival_ms=None):
+        self.received += 1
+        if self.last_seq is not None:
+            gap = seq_diff(frame.seq, self.last_seq)
+            if gap > 1:
+                self.lost += gap - 1
+            elif gap <= 0:
+                # Geç gelen paket daha önce kayıp sayılmıştı
+                self.reordered += 1
+                self.lost = max(0, self.lost - 1)
+                return
+        self.last_seq = frame.seq
+
+        # Saatler senkron değilse mutlak değer anlamsızdır, ama değişimi izlenebilir
+        latency = elapsed_ms(frame.timestamp, arrival_ms)
+        if latency < TIMESTAMP_MODULO // 2:
+            self.latency_ms += (latency - self.latency_ms) / 16
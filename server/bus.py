@@ -0,0 +1,185 @@
+import asyncio
+import pickle
+import struct
+
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+# Çerçeve başlığı: uzunluk (başlık hariç), tür, gönderen worker, hedef worker'lar
+# (worker indeksi başına bir bit; 0 ise gönderen dışındaki herkes)
+FRAME_HEADER = struct.Struct('!IBBI')
+MAX_WORKERS = 32
+
+# Çerçeve türleri
+KIND_SOCKETIO = 1  # Socket.IO olayları (BusManager)
+KIND_STATE = 2  # Paylaşılan oda durumu değişiklikleri (gönderene de geri gelir)
+KIND_AUDIO = 3  # Başka worker'lardaki dinleyicilere giden ses paketleri
+KIND_HELLO = 4  # Bağlanan worker'ın kendini tanıtması (aracıda kalır, iletilmez)
+
+# Bir worker'ın okunmamış verisi bu sınırı aşarsa ona giden ses paketleri
+# bırakılır (geç gelen ses işe yaramaz; durum değişiklikleri ise bırakılmaz)
+AUDIO_BACKLOG_LIMIT = 4 * 1024 * 1024
+
+
+class BusBroker:
+    """Worker'lar arasında çerçeve aktaran yerel mesaj yolu.
+
+    Unix soketi üzerinden bağlanan her worker'dan gelen çerçeveyi diğer
+    bütün bağlantılara aynen iletir. Çerçeveler tek bir döngüde sırayla
+    yazıldığı için her worker aynı sırayı görür; paylaşılan oda durumu bu
+    sıraya göre uygulanır. KIND_STATE çerçeveleri gönderen worker'a da geri
+    gönderilir, böylece o da değişikliği diğerleriyle aynı sırada uygular.
+    Hedefleri belirtilmiş çerçeveler (ses paketleri) sadece o worker'lara
+    yazılır; aracı bağlantıların hangi worker'a ait olduğunu bağlanırken
+    gönderilen KIND_HELLO çerçevesinden öğrenir.
+
+    Redis gibi bir aracı kullanılmak istenirse MessageBus ile aynı
+    publish/subscribe arayüzünü sağlayan bir istemci yazmak yeterlidir.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.writers = {}  # {yazıcı: worker indeksi (tanıtılana kadar None)}
+        self.server = None
+        self.stats = {'frames': 0, 'bytes': 0, 'audio_dropped': 0}
+
+    async def start(self, sock=None):
+        """Yolu dinlemeye başla (sock verilirse önceden açılmış soket kullanılır)"""
+        if sock is not None:
+            self.server = await asyncio.start_unix_server(self._handle, sock=sock)
+        else:
+            self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for writer in list(self.writers):
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        self.writers[writer] = None
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                length, kind, origin, targets = FRAME_HEADER.unpack(header)
+                frame = header + await reader.readexactly(length)
+                if kind == KIND_HELLO:
+                    self.writers[writer] = origin
+                    continue
+                self.stats['frames'] += 1
+                self.stats['bytes'] += len(frame)
+                # Araya await girmeden herkese yaz: sıra bütün worker'larda aynı kalır
+                for other, index in self.writers.items():
+                    if other is writer and kind != KIND_STATE:
+                        continue
+                    if targets and (index is None or not targets >> index & 1):
+                        continue
+                    if kind == KIND_AUDIO and other.transport.get_write_buffer_size() > AUDIO_BACKLOG_LIMIT:
+                        self.stats['audio_dropped'] += 1
+                        continue
+                    other.write(frame)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.pop(writer, None)
+            writer.close()
+
+
+class MessageBus:
+    """BusBroker'a bağlanan worker tarafı istemci.
+
+    Gelen çerçeveler türüne göre kayıtlı işleyiciye sırayla verilir; bir
+    işleyici bitmeden sonraki çerçeve işlenmez.
+    """
+
+    def __init__(self, path, origin=0):
+        self.path = path
+        self.origin = origin
+        self.handlers = {}  # {tür: async işleyici(gönderen, veri)}
+        self.close_callbacks = []  # Bağlantı kapanınca çağrılır
+        self.connected = False
+        self.reader = None
+        self.writer = None
+        self.task = None
+        self.stats = {'sent': 0, 'received': 0}
+
+    def subscribe(self, kind, handler):
+        self.handlers[kind] = handler
+
+    async def connect(self, retries=50, delay=0.1):
+        """Aracıya bağlan (aracı henüz hazır değilse bir süre tekrar dene)"""
+        for attempt in range(retries):
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if attempt == retries - 1:
+                    raise
+                await asyncio.sleep(delay)
+        self.connected = True
+        self.publish(KIND_HELLO, b'')
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def publish(self, kind, payload, targets=0):
+        """Çerçeveyi aracıya gönder (bloklamaz; targets: hedef worker bitleri)"""
+        if not self.connected:
+            return  # Kapanış sırasında gönderilemeyenler bırakılır
+        self.writer.write(FRAME_HEADER.pack(len(payload), kind, self.origin, targets) + payload)
+        self.stats['sent'] += 1
+
+    async def _run(self):
+        try:
+            while True:
+                header = await self.reader.readexactly(FRAME_HEADER.size)
+                length, kind, origin, _ = FRAME_HEADER.unpack(header)
+                payload = await self.reader.readexactly(length)
+                self.stats['received'] += 1
+                handler = self.handlers.get(kind)
+                if handler is None:
+                    continue
+                try:
+                    await handler(origin, payload)
+                except Exception as e:
+                    print(f"Mesaj yolu işleyici hatası: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            print("Mesaj yolu bağlantısı kapandı")
+        finally:
+            self.connected = False
+            for callback in self.close_callbacks:
+                callback()
+
+
+class BusManager(AsyncPubSubManager):
+    """Socket.IO istemci yöneticisi: odaya gönderilen olayları MessageBus
+    üzerinden diğer worker'lardaki bağlantılara da ulaştırır."""
+
+    name = 'bus'
+
+    def __init__(self, bus, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = bus
+        self.queue = asyncio.Queue()
+        bus.subscribe(KIND_SOCKETIO, self._receive)
+
+    async def _receive(self, origin, payload):
+        self.queue.put_nowait(payload)
+
+    async def _publish(self, data):
+        self.bus.publish(KIND_SOCKETIO, pickle.dumps(data))
+
+    async def _listen(self):
+        while True:
+            yield pickle.loads(await self.queue.get())
@@ -0,0 +1,476 @@
+"""Odaların birden fazla server'a (düğüme) dağıtıldığı küme modu.
+
+Her oda, adının tutarlı özet (consistent hashing) halkasındaki yerine göre
+tek bir düğüme aittir; üyeleri, sohbet geçmişi ve ses trafiği o düğümdedir.
+Oda listesi (katalog) ise her düğümde tamdır. Başka düğüme ait bir odaya
+katılmak isteyen istemciye join_room yanıtında o düğümün adresi döner.
+
+Düğüm eklendiğinde ya da ayrıldığında halka değişir; sahibi değişen
+odaların üyeleri room_moved olayıyla yeni düğüme yönlendirilir ve geçmişi
+HTTP üzerinden yeni sahibine taşınır. Düğümler birbirini düzenli aralıklarla
+yoklar; yanıt vermeyen düğüm kümeden çıkarılır (çöken düğümün geçmişi, düğüm
+yeniden başlayıp kümeye katıldığında sahiplerine aktarılır).
+
+Düğümler arası uçlar istemcilerin bağlandığı porttan ayrı, iç ağdaki bir
+portta (--cluster-port) dinlenir ve her istek ortak anahtarla (--secret ya
+da CLUSTER_SECRET) doğrulanır; anahtar verilmeden küme modu başlamaz.
+
+Kullanım (aynı makinede üç düğüm):
+    export CLUSTER_SECRET=...
+    python server/cluster.py --port 8081 --db sqlite:///node1.db
+    python server/cluster.py --port 8082 --db sqlite:///node2.db --seed http://127.0.0.1:9081
+    python server/cluster.py --port 8083 --db sqlite:///node3.db --seed http://127.0.0.1:9081
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import hmac
+import os
+import signal
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+from database import Database
+from maintenance import retention_policy
+from server import VoiceChatServer
+
+
+class HashRing:
+    """Tutarlı özet halkası.
+
+    Her düğüm halkaya `replicas` sanal noktayla yerleşir; bir anahtar,
+    özetinden sonra gelen ilk noktanın düğümüne aittir. Düğüm eklenip
+    çıkarıldığında sadece o düğümün aralığındaki anahtarlar yer değiştirir.
+    """
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self.points = []  # Sıralı (özet, düğüm kimliği)
+        for node_id in nodes:
+            self.add(node_id)
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def add(self, node_id):
+        if node_id in self:
+            return
+        for i in range(self.replicas):
+            bisect.insort(self.points, (self.hash(f'{node_id}#{i}'), node_id))
+
+    def remove(self, node_id):
+        self.points = [point for point in self.points if point[1] != node_id]
+
+    def owner(self, key):
+        """Anahtarın ait olduğu düğüm (halka boşsa None)"""
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, (self.hash(key),)) % len(self.points)
+        return self.points[index][1]
+
+    def __contains__(self, node_id):
+        return any(point[1] == node_id for point in self.points)
+
+
+class ClusterNode:
+    """Bir VoiceChatServer'ın kümedeki düğümü.
+
+    Düğümler arası iletişim ayrı bir aiohttp uygulamasındaki /cluster/*
+    HTTP uçlarıyla yapılır; her düğümün istemcilerin bağlandığı adresi (url)
+    ve diğer düğümlerin bağlandığı iç adresi (peer) vardır. Görünüm (düğüm listesi) değişiklikleri
+    join/leave çağrılarıyla yayılır; yoklamalarda öğrenilen bilinmeyen
+    düğümler de eklenir. Bilinen düğümler arasında son görünümde sahibi
+    değişen odalar sırayla (rebalance) devredilir.
+    """
+
+    # Geçmiş devredilirken tek istekte gönderilen mesaj sayısı
+    HANDOFF_BATCH = 500
+
+    def __init__(self, node_id, url, peer_url, seeds=(), secret=None, heartbeat=2.0, max_failures=3, replicas=100,
+                 host='127.0.0.1', port=None):
+        if not secret:
+            raise ValueError("Küme modu için ortak anahtar (secret) gerekli")
+        self.node_id = node_id
+        self.url = url
+        self.peer_url = peer_url
+        self.seeds = [seed for seed in seeds if seed != peer_url]
+        self.secret = secret
+        self.heartbeat = heartbeat
+        self.max_failures = max_failures
+        # Düğümler arası uçların dinlendiği iç adres
+        self.host = host
+        self.port = port
+
+        # {düğüm kimliği: {'url': istemci adresi, 'peer': düğümler arası adres}}
+        self.nodes = {node_id: {'url': url, 'peer': peer_url}}
+        self.ring = HashRing([node_id], replicas)
+        self.departed = set()  # Çıkarılan düğümler (yoklamalarla geri eklenmez)
+        self.failures = {}  # {düğüm kimliği: art arda başarısız yoklama}
+        # Son dengelemeden sonra bu düğümün sorumlu olduğu odalar; halkaya
+        # göre artık başkasına ait olanlar devredilir
+        self.owned = set()
+        self.lock = asyncio.Lock()  # Dengelemeler sırayla çalışır
+
+        self.server = None
+        self.app = None
+        self.runner = None
+        self.session = None
+        self.task = None
+
+        self.stats = {
+            'view_changes': 0,
+            'redirects': 0,
+            'rooms_moved_out': 0,
+            'rooms_moved_in': 0,
+            'messages_moved_out': 0,
+            'messages_moved_in': 0,
+            'handoff_errors': 0
+        }
+
+    def attach(self, server):
+        """Düğümler arası uçları (istemcilere açık olmayan) ayrı bir uygulamada hazırla"""
+        self.server = server
+        self.app = web.Application()
+        router = self.app.router
+        router.add_get('/cluster/nodes', self.handle_nodes)
+        router.add_post('/cluster/join', self.handle_join)
+        router.add_post('/cluster/leave', self.handle_leave)
+        router.add_post('/cluster/rooms', self.handle_rooms)
+        router.add_post('/cluster/delete', self.handle_delete)
+        router.add_post('/cluster/history', self.handle_history)
+
+    def owner(self, room_name):
+        return self.ring.owner(room_name)
+
+    def owns(self, room_name):
+        return self.ring.owner(room_name) == self.node_id
+
+    def redirect(self, room_name):
+        """Odaya katılmak isteyen istemciyi odanın düğümüne yönlendiren yanıt"""
+        self.stats['redirects'] += 1
+        return {'status': 'redirect', 'room': room_name, 'url': self.nodes[self.owner(room_name)]['url']}
+
+    async def start(self):
+        """İç uçları dinle, tohum düğümlerden birine katıl ve yoklamayı başlat (server başladıktan sonra)"""
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        print(f"[CLUSTER] Düğümler arası uçlar: {self.host}:{self.port}")
+        self.session = aiohttp.ClientSession(headers={'X-Cluster-Secret': self.secret},
+                                             timeout=aiohttp.ClientTimeout(total=10))
+        # Yerel kayıtlar tek düğümlü halkaya göre bu düğümündür; katıldıktan
+        # sonra başkasına düşenler devredilir (çöküp geri gelen düğüm de
+        # böylece elindeki geçmişi sahiplerine aktarır)
+        self.owned = set(self.server.room_ids)
+        for seed in self.seeds:
+            try:
+                view = await self.post(seed, '/cluster/join',
+                                       {'id': self.node_id, 'url': self.url, 'peer': self.peer_url})
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"[CLUSTER] {seed} düğümüne katılınamadı: {e}")
+                continue
+            for room_name in view['rooms']:
+                await self.add_room(room_name)
+            self.change_view(add=view['nodes'])
+            print(f"[CLUSTER] Kümeye katılındı: {len(self.nodes)} düğüm")
+            break
+        self.task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        """Kümeden ayrıl ve bütün odaları yeni sahiplerine devret"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if len(self.nodes) > 1:
+            self.ring.remove(self.node_id)
+            await self.broadcast('/cluster/leave', {'id': self.node_id, 'relay': False})
+            await self.rebalance()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def change_view(self, add=None, remove=()):
+        """Düğüm listesini güncelle; halka değiştiyse dengelemeyi başlat"""
+        changed = False
+        for node_id, addresses in (add or {}).items():
+            if node_id not in self.nodes:
+                self.nodes[node_id] = addresses
+                self.ring.add(node_id)
+                changed = True
+        for node_id in remove:
+            if node_id != self.node_id and self.nodes.pop(node_id, None) is not None:
+                self.ring.remove(node_id)
+                self.failures.pop(node_id, None)
+                changed = True
+        if changed:
+            self.stats['view_changes'] += 1
+            print(f"[CLUSTER] Görünüm: {sorted(self.nodes)}")
+            asyncio.create_task(self.rebalance())
+
+    async def rebalance(self):
+        """Sahibi değişen odaları yeni sahiplerine devret"""
+        async with self.lock:
+            for room_name in sorted(self.owned):
+                if room_name not in self.server.room_ids:
+                    self.owned.discard(room_name)
+                elif not self.owns(room_name) and self.owner(room_name) is not None:
+                    try:
+                        await self.hand_off(room_name)
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        # Oda sorumluluk listesinde kalır, sonraki yoklamada tekrar denenir
+                        self.stats['handoff_errors'] += 1
+                        print(f"[CLUSTER] {room_name} devredilemedi: {e}")
+                        continue
+                    self.owned.discard(room_name)
+            self.owned.update(room_name for room_name in self.server.room_ids if self.owns(room_name))
+
+    async def hand_off(self, room_name):
+        """Odanın üyelerini yeni düğüme yönlendir ve geçmişini oraya taşı"""
+        server = self.server
+        node = self.nodes[self.owner(room_name)]
+        url = node['url']
+        await server.sio.emit('room_moved', {'room': room_name, 'url': url}, room=room_name)
+        members = await server.replicate('release', room_name)
+        for user_sid in members:
+            await server.sio.leave_room(user_sid, room_name)
+
+        # Yazılmayı bekleyen mesajlar da taşınsın; her sayfa karşı taraf
+        # kaydettikten sonra buradan silinir. Sayfalar eskiden yeniye gider ki
+        # karşı tarafta verilen kimlikler (zaman, id) sırasını korusun. İlk
+        # sayfa (mesaj olmasa da) karşı tarafa odanın geldiğini bildirir
+        await server.message_writer.flush()
+        moved = 0
+        first = True
+        while True:
+            # max_count=0: bütün mesajlar, en eskiden başlayarak
+            messages = await server.db.get_expired_messages(room_name, max_count=0, limit=self.HANDOFF_BATCH)
+            if not messages and not (first and members):
+                break
+            await self.post(node['peer'], '/cluster/history', {
+                'room': room_name,
+                'first': first,
+                'messages': [[m.username, m.content, m.timestamp.isoformat()] for m in messages]
+            })
+            await server.db.delete_messages([m.id for m in messages])
+            moved += len(messages)
+            first = False
+            if not messages:
+                break
+        if members or moved:
+            self.stats['rooms_moved_out'] += 1
+            self.stats['messages_moved_out'] += moved
+            print(f"[CLUSTER] {room_name} odası {url} düğümüne devredildi "
+                  f"({len(members)} üye, {moved} mesaj)")
+
+    async def add_room(self, room_name):
+        """Katalogdaki odayı yerelde de oluştur"""
+        await self.server.add_room(room_name)
+        if self.owns(room_name):
+            self.owned.add(room_name)
+
+    async def room_created(self, room_name):
+        """Bu düğümde oluşturulan odayı diğer düğümlere duyur"""
+        if self.owns(room_name):
+            self.owned.add(room_name)
+        await self.broadcast('/cluster/rooms', {'op': 'created', 'room': room_name})
+
+    async def room_deleted(self, room_name):
+        """Sahibi olarak silinen odayı diğer düğümlere duyur"""
+        self.owned.discard(room_name)
+        await self.broadcast('/cluster/rooms', {'op': 'deleted', 'room': room_name})
+
+    async def forward_delete(self, room_name):
+        """Silme isteğini odanın sahibine ilet (üyeler orada olduğundan boşluk kontrolünü o yapar)"""
+        try:
+            return await self.post(self.nodes[self.owner(room_name)]['peer'], '/cluster/delete', {'room': room_name})
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return {'status': 'error', 'message': 'Odanın sunucusuna ulaşılamadı'}
+
+    async def post(self, url, path, payload, timeout=None):
+        async with self.session.post(url + path, json=payload, timeout=timeout) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def broadcast(self, path, payload, exclude=None):
+        """İsteği diğer bütün düğümlere gönder (ulaşılamayanlar yoklamayla düşer)"""
+        targets = [(node_id, node['peer']) for node_id, node in self.nodes.items()
+                   if node_id not in (self.node_id, exclude)]
+        results = await asyncio.gather(*(self.post(url, path, payload) for _, url in targets),
+                                       return_exceptions=True)
+        for (node_id, _), result in zip(targets, results):
+            if isinstance(result, Exception):
+                print(f"[CLUSTER] {node_id} düğümüne {path} gönderilemedi: {result}")
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            for node_id, node in list(self.nodes.items()):
+                if node_id == self.node_id:
+                    continue
+                try:
+                    async with self.session.get(node['peer'] + '/cluster/nodes',
+                                                timeout=aiohttp.ClientTimeout(total=self.heartbeat)) as response:
+                        response.raise_for_status()
+                        view = await response.json()
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    self.failures[node_id] = self.failures.get(node_id, 0) + 1
+                    if self.failures[node_id] >= self.max_failures:
+                        print(f"[CLUSTER] {node_id} yanıt vermiyor, kümeden çıkarılıyor")
+                        self.departed.add(node_id)
+                        self.change_view(remove=[node_id])
+                        await self.broadcast('/cluster/leave', {'id': node_id, 'relay': False})
+                    continue
+                self.failures.pop(node_id, None)
+                unknown = {other_id: other for other_id, other in view['nodes'].items()
+                           if other_id not in self.nodes and other_id not in self.departed}
+                if unknown:
+                    self.change_view(add=unknown)
+            # Devredilemeyen odalar varsa tekrar dene
+            if any(not self.owns(room_name) for room_name in self.owned):
+                await self.rebalance()
+
+    def check(self, request):
+        secret = request.headers.get('X-Cluster-Secret', '')
+        if not hmac.compare_digest(secret.encode('utf-8'), self.secret.encode('utf-8')):
+            raise web.HTTPForbidden()
+
+    async def handle_nodes(self, request):
+        self.check(request)
+        return web.json_response({'id': self.node_id, 'nodes': self.nodes})
+
+    async def handle_join(self, request):
+        """Yeni düğümü ekle; düğüm listesini ve oda kataloğunu döndür"""
+        self.check(request)
+        data = await request.json()
+        node_id = data['id']
+        addresses = {'url': data['url'], 'peer': data['peer']}
+        self.departed.discard(node_id)
+        if self.nodes.get(node_id) not in (None, addresses):
+            self.change_view(remove=[node_id])  # Aynı kimlikle yeni adres
+        self.change_view(add={node_id: addresses})
+        if data.get('relay', True):
+            asyncio.create_task(self.broadcast(
+                '/cluster/join', {'id': node_id, **addresses, 'relay': False}, exclude=node_id))
+        return web.json_response({'nodes': self.nodes, 'rooms': sorted(self.server.room_ids)})
+
+    async def handle_leave(self, request):
+        self.check(request)
+        data = await request.json()
+        self.departed.add(data['id'])
+        self.change_view(remove=[data['id']])
+        if data.get('relay', True):
+            asyncio.create_task(self.broadcast('/cluster/leave', {'id': data['id'], 'relay': False},
+                                               exclude=data['id']))
+        return web.json_response({'status': 'success'})
+
+    async def handle_rooms(self, request):
+        """Başka düğümde oluşturulan ya da silinen odayı kataloğa uygula"""
+        self.check(request)
+        data = await request.json()
+        if data['op'] == 'created':
+            await self.add_room(data['room'])
+        elif data['op'] == 'deleted':
+            self.owned.discard(data['room'])
+            await self.server.remove_room(data['room'])
+        return web.json_response({'status': 'success'})
+
+    async def handle_delete(self, request):
+        """Başka düğümden iletilen oda silme isteği (bu düğüm odanın sahibi)"""
+        self.check(request)
+        data = await request.json()
+        result = await self.server.remove_room(data['room'])
+        if result['status'] == 'success':
+            print(f"[LOG] Oda başka düğümden silindi: {data['room']}")
+            await self.room_deleted(data['room'])
+        return web.json_response(result)
+
+    async def handle_history(self, request):
+        """Devredilen odanın geçmişinden bir sayfayı kaydet"""
+        self.check(request)
+        data = await request.json()
+        room_name = data['room']
+        if data.get('first'):
+            self.stats['rooms_moved_in'] += 1
+        await self.add_room(room_name)  # Katalog duyurusundan önce gelebilir
+        await self.server.db.add_messages([
+            (room_name, username, content, datetime.fromisoformat(timestamp))
+            for username, content, timestamp in data['messages']])
+        # Önbellek bir sonraki katılımda taşınan mesajlarla yeniden yüklenir
+        await self.server.message_writer.flush()
+        self.server.history.evict(room_name)
+        self.owned.add(room_name)
+        self.stats['messages_moved_in'] += len(data['messages'])
+        return web.json_response({'status': 'success'})
+
+    def get_stats(self):
+        return {
+            'node_id': self.node_id,
+            'nodes': self.nodes,
+            'owned_rooms': len(self.owned),
+            **self.stats
+        }
+
+
+async def run_node(args):
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    url = args.url or f'http://127.0.0.1:{args.port}'
+    cluster_port = args.cluster_port or args.port + 1000
+    peer_url = args.peer_url or f'http://127.0.0.1:{cluster_port}'
+    cluster = ClusterNode(args.node_id or url, url, peer_url, args.seed, args.secret, args.heartbeat,
+                          host=args.cluster_host, port=cluster_port)
+    server = VoiceChatServer(storage=Database(args.db or f'sqlite:///chat-{args.port}.db'),
+                             room_idle_ttl=args.room_idle_ttl, cluster=cluster, max_speakers=args.max_speakers,
+                             retention=retention_policy(args.retention_days, args.retention_count))
+    await server.start(args.host, args.port)
+    try:
+        while True:
+            await asyncio.sleep(1)
+    except asyncio.CancelledError:
+        print("Düğüm kapatılıyor...")
+    await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sesli sohbet server'ını küme düğümü olarak çalıştır")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--url', help="İstemcilerin bu düğüme ulaşacağı adres "
+                                      "(varsayılan http://127.0.0.1:PORT)")
+    parser.add_argument('--cluster-host', default='127.0.0.1',
+                        help="Düğümler arası uçların dinleneceği (iç ağdaki) adres")
+    parser.add_argument('--cluster-port', type=int, help="Düğümler arası uçların portu (varsayılan PORT+1000)")
+    parser.add_argument('--peer-url', help="Diğer düğümlerin bu düğüme ulaşacağı iç adres "
+                                           "(varsayılan http://127.0.0.1:CLUSTER_PORT)")
+    parser.add_argument('--node-id', help="Halkadaki kimlik (varsayılan adres)")
+    parser.add_argument('--seed', action='append', default=[],
+                        help="Katılmak için bağlanılacak düğümün iç adresi (birden fazla verilebilir)")
+    parser.add_argument('--db', help="Düğümün veritabanı (varsayılan sqlite:///chat-PORT.db)")
+    parser.add_argument('--secret', default=os.environ.get('CLUSTER_SECRET'),
+                        help="Düğümler arası isteklerde aranacak ortak anahtar (varsayılan CLUSTER_SECRET)")
+    parser.add_argument('--heartbeat', type=float, default=2.0, help="Yoklama aralığı (sn)")
+    parser.add_argument('--room-idle-ttl', type=float, default=300,
+                        help="Boş odaların bellekten bırakılma süresi (sn)")
+    parser.add_argument('--max-speakers', type=int,
+                        help="Odada sesi iletilecek en fazla konuşmacı (varsayılan: hepsi)")
+    parser.add_argument('--retention-days', type=float,
+                        help="Mesajların arşive taşınmadan önce saklanacağı gün (varsayılan: süresiz)")
+    parser.add_argument('--retention-count', type=int,
+                        help="Oda başına veritabanında tutulacak en fazla mesaj (varsayılan: sınırsız)")
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error("küme modu için --secret ya da CLUSTER_SECRET gerekli")
+    try:
+        asyncio.run(run_node(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import asyncio
+from engineio import packet as eio_packet
+from socketio import packet
+from outbound import PRIORITY_AUDIO
+
+
+class AudioFanout:
+    """Ses paketlerini odadaki dinleyicilere dağıtır.
+
+    Paket her dinleyici için ayrı ayrı oluşturulmak yerine bir kez
+    serileştirilir ve aynı Engine.IO paketleri tüm alıcılara eşzamanlı
+    gönderilir. Böylece yavaş bir soket diğerlerini bekletmez. outbound
+    verilirse paketler alıcıların gönderim kuyruklarına ses önceliğiyle
+    eklenir.
+    """
+
+    def __init__(self, sio, namespace='/', outbound=None):
+        self.sio = sio
+        self.namespace = namespace
+        self.outbound = outbound
+
+    def encode(self, event, data):
+        """Socket.IO olayını bir kez Engine.IO paketlerine çevir"""
+        pkt = self.sio.packet_class(packet.EVENT, namespace=self.namespace, data=[event, data])
+        encoded_packet = pkt.encode()
+        if not isinstance(encoded_packet, list):
+            encoded_packet = [encoded_packet]
+        return [eio_packet.Packet(eio_packet.MESSAGE, p) for p in encoded_packet]
+
+    async def broadcast(self, event, data, recipients):
+        """Olayı verilen SID'lere tek serileştirme ile gönder"""
+        eio_packets = self.encode(event, data)
+        if self.outbound is not None:
+            for sid in recipients:
+                eio_sid = self.sio.manager.eio_sid_from_sid(sid, self.namespace)
+                if eio_sid is not None:
+                    self.outbound.put(eio_sid, eio_packets, PRIORITY_AUDIO)
+            return
+        tasks = []
+        for sid in recipients:
+            eio_sid = self.sio.manager.eio_sid_from_sid(sid, self.namespace)
+            if eio_sid is not None:
+                tasks.append(self._send(eio_sid, eio_packets))
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _send(self, eio_sid, eio_packets):
+        for eio_pkt in eio_packets:
+            await self.sio.eio.send_packet(eio_sid, eio_pkt)
@@ -0,0 +1,78 @@
+from collections import deque
+
+
+def serialize_message(username, content, timestamp, message_id=None):
+    """Mesajı istemcinin beklediği sözlüğe çevir"""
+    return {
+        'id': message_id,
+        'username': username,
+        'message': content,
+        'timestamp': timestamp.strftime("%H:%M:%S"),
+        'time': timestamp.isoformat()  # Daha eski sayfalar için imleç
+    }
+
+
+class RoomHistoryCache:
+    """Her oda için son `size` mesajı bellekte tutan halka tampon.
+
+    Oda bellekte etkinleştiğinde veritabanından doldurulur, yeni mesajlar
+    yazma kuyruğuna girerken eklenir; id'leri yazıldıktan sonra set_id() ile
+    doldurulur. Böylece odaya katılan kullanıcıya geçmiş veritabanına
+    gitmeden gönderilir. Oda bellekten bırakılınca evict() ile silinir.
+    """
+
+    def __init__(self, size=50):
+        self.size = size
+        self.rooms = {}  # {oda adı: deque (eskiden yeniye)}
+        self.complete = set()  # Tüm geçmişi bellekte olan odalar
+
+    async def load(self, db, room_name):
+        """Odanın son mesajlarını veritabanından yükle (zaten yüklüyse bir şey yapmaz)"""
+        if room_name in self.rooms:
+            return
+        messages = await db.get_room_messages(room_name, limit=self.size)
+        if room_name in self.rooms:
+            return  # Beklerken başka bir katılım yükledi
+        history = self.rooms[room_name] = deque(maxlen=self.size)
+        for message in reversed(messages):
+            history.append(serialize_message(message.username, message.content,
+                                             message.timestamp, message.id))
+        if len(messages) < self.size:
+            self.complete.add(room_name)
+
+    def evict(self, room_name):
+        self.rooms.pop(room_name, None)
+        self.complete.discard(room_name)
+
+    def append(self, room_name, item):
+        history = self.rooms.get(room_name)
+        if history is None:
+            return  # Oda yüklü değil; geçmiş gerektiğinde veritabanından okunur
+        if len(history) == self.size:
+            self.complete.discard(room_name)
+        history.append(item)
+
+    def set_id(self, room_name, username, time, message_id):
+        """Yazma kuyruğundan eklenen mesaja veritabanındaki id'sini ver"""
+        history = self.rooms.get(room_name)
+        if history is None:
+            return
+        for item in reversed(history):
+            if item['id'] is None and item['time'] == time and item['username'] == username:
+                item['id'] = message_id
+                return
+
+    def get(self, room_name, limit=None):
+        """Son mesajları yeniden eskiye sıralı getir.
+
+        Bellekteki mesajlar isteği karşılamıyorsa None döner; bu durumda
+        veritabanına gidilmelidir.
+        """
+        if limit is None:
+            limit = self.size
+        history = self.rooms.get(room_name)
+        if history is None:
+            return None
+        if limit > len(history) and room_name not in self.complete:
+            return None
+        return [history[i] for i in range(len(history) - 1, max(-1, len(history) - 1 - limit), -1)]
@@ -0,0 +1,148 @@
+import asyncio
+import gzip
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+
+def retention_policy(days=None, count=None):
+    """Komut satırı seçeneklerinden bütün odalar için saklama kuralı (yoksa None)"""
+    policy = {}
+    if days is not None:
+        policy['max_age_days'] = days
+    if count is not None:
+        policy['max_count'] = count
+    return {'*': policy} if policy else None
+
+
+class MaintenanceTask:
+    """Mesaj saklama, arşivleme ve veritabanı bakımı yapan arka plan görevi.
+
+    Her turda odaların saklama kuralına (yaş ve/veya adet) göre süresi
+    dolmuş mesajlar küçük parçalar halinde gzip'li, tarihe göre bölünmüş
+    JSON Lines dosyalarına taşınır ve veritabanından silinir. Ardından boşalan
+    sayfalar parça parça geri verilir ve WAL checkpoint yapılır. Arşiv
+    dosyaları ayrı bir thread'de yazılır, parçalar arasında olay döngüsüne
+    söz verilir.
+
+    retention örneği: {'*': {'max_age_days': 365}, 'Genel Sohbet': {'max_count': 100000}}
+    on_archived(oda adı): mesajları arşive taşınan oda için çağrılır (async);
+    bellekteki geçmişin artık veritabanında olmayan mesajları göstermemesi için
+    """
+
+    def __init__(self, db, retention=None, archive_dir='archive', interval=3600,
+                 batch_size=500, pause=0.02, vacuum_pages=256, on_archived=None):
+        self.db = db
+        self.retention = retention or {}
+        self.on_archived = on_archived
+        self.archive_dir = Path(archive_dir)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='archive-writer')
+        self.task = None
+        self.stats = {
+            'runs': 0,
+            'archived': 0,
+            'vacuumed_pages': 0,
+            'last_run_ms': 0.0
+        }
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.executor.shutdown(wait=True)
+
+    def policy_for(self, room_name):
+        """Odanın saklama kuralı: (max_age, max_count)"""
+        policy = self.retention.get(room_name, self.retention.get('*', {}))
+        max_age = policy.get('max_age_days')
+        return (timedelta(days=max_age) if max_age is not None else None,
+                policy.get('max_count'))
+
+    async def run_once(self):
+        """Bir bakım turu"""
+        start = time.perf_counter()
+
+        for room_name in list(self.db.room_ids):
+            max_age, max_count = self.policy_for(room_name)
+            if max_age is None and max_count is None:
+                continue
+            archived = 0
+            while True:
+                moved = await self._archive_batch(room_name, max_age, max_count)
+                archived += moved
+                if moved < self.batch_size:
+                    break
+                await asyncio.sleep(self.pause)
+            self.stats['archived'] += archived
+            if archived and self.on_archived is not None:
+                await self.on_archived(room_name)
+
+        while True:
+            freed = await self.db.incremental_vacuum(self.vacuum_pages)
+            self.stats['vacuumed_pages'] += freed
+            if freed < self.vacuum_pages:
+                break
+            await asyncio.sleep(self.pause)
+
+        await self.db.checkpoint()
+        self.stats['runs'] += 1
+        self.stats['last_run_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Bakım hatası: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _archive_batch(self, room_name, max_age, max_count):
+        """Bir parça süresi dolmuş mesajı arşive yaz ve sil"""
+        rows = await self.db.get_expired_messages(room_name, max_age, max_count, self.batch_size)
+        if not rows:
+            return 0
+
+        # Günlere göre grupla: archive/<oda id>/<YYYY-MM-DD>.jsonl.gz
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[row.timestamp.date().isoformat()].append({
+                'id': row.id,
+                'room': room_name,
+                'username': row.username,
+                'content': row.content,
+                'timestamp': row.timestamp.isoformat()
+            })
+
+        await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._write_archive, self.archive_dir / str(rows[0].room_id), by_day)
+
+        # Arşiv diske yazıldıktan sonra sil: çökme olursa en kötü ihtimalle
+        # aynı mesaj arşivde iki kez bulunur, kaybolmaz
+        await self.db.delete_messages([row.id for row in rows])
+        return len(rows)
+
+    @staticmethod
+    def _write_archive(room_dir, by_day):
+        """Günlere ayrılmış kayıtları arşiv dosyalarına ekle (arşiv thread'inde)"""
+        room_dir.mkdir(parents=True, exist_ok=True)
+        for day, records in by_day.items():
+            # Ekleme modu yeni bir gzip üyesi açar; dosya yine tek parça okunur
+            with gzip.open(room_dir / f"{day}.jsonl.gz", 'at', encoding='utf-8') as archive:
+                for record in records:
+                    archive.write(json.dumps(record, ensure_ascii=False) + '\n')
@@ -0,0 +1,266 @@
+import asyncio
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from common import protocol
+from common.codec import get_codec, get_codec_by_id, soft_clip
+
+# Odanın ses dağıtım modları
+MODE_FORWARD = 'forward'  # Her konuşmacının paketi dinleyicilere aynen iletilir
+MODE_MIX = 'mix'  # Server paketleri karıştırıp dinleyici başına tek akış gönderir
+AUDIO_MODES = (MODE_FORWARD, MODE_MIX)
+
+
+def mix_frames(frame_count, stream_id, seq, contributions, listeners):
+    """Bir periyodun paketlerini çöz, karıştır ve dinleyicilerin codec'iyle kodla.
+
+    Sadece argümanlarıyla çalışır; olay döngüsünü bekletmemek için executor'da
+    (thread ya da süreç havuzu) çağrılır.
+    contributions: {gönderen indeksi: (codec kimliği, yük, seviye)}
+    listeners: [(sid, gönderen indeksi, codec adı)]
+    Dönen değer: ([(ikili paket, [sid, ...])], çözülemeyen paket sayısı, süre (ms))
+    """
+    start = time.perf_counter()
+    decoded = {}
+    levels = {}
+    errors = 0
+    for sender, (codec_id, payload, level) in contributions.items():
+        try:
+            decoded[sender] = np.frombuffer(get_codec_by_id(codec_id).decode(payload), dtype=np.float32)
+        except (KeyError, ValueError, struct.error):
+            errors += 1
+            continue
+        levels[sender] = level
+    if not decoded:
+        return [], errors, (time.perf_counter() - start) * 1000
+
+    stack = np.zeros((len(decoded), frame_count), dtype=np.float32)
+    rows = {}
+    for row, (sender, samples) in enumerate(decoded.items()):
+        count = min(len(samples), frame_count)
+        stack[row, :count] = samples[:count]
+        rows[sender] = row
+    total = stack.sum(axis=0)
+
+    timestamp = protocol.now_ms()
+    groups = {}  # {(çıkarılan gönderen, codec adı): (paket, [sid, ...])}
+    for sid, member_id, codec_name in listeners:
+        row = rows.get(member_id)
+        if row is not None and len(rows) == 1:
+            continue  # Sadece kendisi konuşuyor, duyacağı bir şey yok
+        key = (member_id if row is not None else None, codec_name)
+        group = groups.get(key)
+        if group is None:
+            samples = total if row is None else total - stack[row]
+            level = min((value for sender, value in levels.items() if sender != key[0]),
+                        default=protocol.LEVEL_SILENT)
+            codec = get_codec(codec_name)
+            frame = protocol.pack_frame(stream_id, protocol.MIX_SENDER, seq, timestamp,
+                                        codec.codec_id, codec.encode(soft_clip(samples).tobytes()),
+                                        level=level)
+            group = groups[key] = (frame, [])
+        group[1].append(sid)
+    return list(groups.values()), errors, (time.perf_counter() - start) * 1000
+
+
+class RoomMixer:
+    """Tek bir odanın karıştırma durumu.
+
+    Gönderen başına birkaç paketlik kuyruk tutulur; her saat vuruşunda her
+    kuyruktan bir paket alınıp toplanır. Dinleyiciye toplamdan kendi katkısı
+    çıkarılmış karışım (mix-minus) gönderilir. Konuşmayan dinleyicilerin
+    hepsi aynı karışımı duyduğu için bu karışım codec başına bir kez
+    kodlanır; ayrıca kodlama sadece konuşan dinleyiciler için yapılır.
+    Paketler kuyrukta kodlanmış halde bekler, vuruşta çözülür.
+    """
+
+    def __init__(self, stream_id, frame_count, depth=3):
+        self.stream_id = stream_id
+        self.frame_count = frame_count
+        self.depth = depth
+        self.queues = {}  # {gönderen indeksi: deque[(codec kimliği, yük, seviye)]}
+        self.seq = 0
+        self.wake = asyncio.Event()
+        self.task = None
+
+        self.stats = {
+            'ticks': 0,
+            'late_ticks': 0,  # Saatin bir periyottan fazla geciktiği vuruşlar
+            'frames_mixed': 0,
+            'frames_dropped': 0,  # Kuyruk dolduğu için atılan eski paketler
+            'encodes': 0,
+            'frames_sent': 0,
+            'mix_ms_total': 0.0,
+            'max_mix_ms': 0.0
+        }
+
+    def push(self, sender, codec_id, payload, level):
+        """Paketi gönderenin kuyruğuna ekle"""
+        queue = self.queues.get(sender)
+        if queue is None:
+            queue = self.queues[sender] = deque(maxlen=self.depth)
+        if len(queue) == self.depth:
+            self.stats['frames_dropped'] += 1  # Saat gönderenin gerisinde kaldı
+        queue.append((codec_id, payload, level))
+        self.wake.set()
+
+    def remove(self, sender):
+        self.queues.pop(sender, None)
+
+    def pending(self):
+        return any(self.queues.values())
+
+    def take(self):
+        """Her gönderenin kuyruğundan bir paket al"""
+        contributions = {sender: queue.popleft() for sender, queue in self.queues.items() if queue}
+        self.stats['frames_mixed'] += len(contributions)
+        return contributions
+
+    def job(self, contributions, listeners):
+        """Bir periyodun mix_frames argümanları (sıra numarası ilerler)"""
+        args = (self.frame_count, self.stream_id, self.seq, contributions, listeners)
+        self.seq = (self.seq + 1) % protocol.SEQ_MODULO
+        return args
+
+    def record(self, result):
+        """mix_frames sonucunu sayaçlara işle; gönderilecek grupları döndürür"""
+        groups, errors, elapsed = result
+        self.stats['ticks'] += 1
+        self.stats['encodes'] += len(groups)
+        self.stats['frames_sent'] += sum(len(sids) for _, sids in groups)
+        self.stats['mix_ms_total'] += elapsed
+        self.stats['max_mix_ms'] = max(self.stats['max_mix_ms'], round(elapsed, 3))
+        return groups
+
+    def mix(self, listeners):
+        """Bir periyodu çağıran thread'de karıştır.
+
+        listeners: [(sid, gönderen indeksi, codec adı)]
+        Dönen değer: [(ikili paket, [sid, ...])]
+        """
+        contributions = self.take()
+        if not contributions:
+            return []
+        return self.record(mix_frames(*self.job(contributions, listeners)))
+
+    def get_stats(self):
+        ticks = self.stats['ticks']
+        return {
+            **self.stats,
+            'mix_ms_total': round(self.stats['mix_ms_total'], 3),
+            'avg_mix_ms': round(self.stats['mix_ms_total'] / ticks, 3) if ticks else 0.0,
+            'senders': len(self.queues)
+        }
+
+
+class AudioMixer:
+    """Karıştırma modundaki odaların (MCU) saatlerini yönetir.
+
+    İleti modunda (varsayılan) her konuşmacının paketi dinleyicilere ayrı
+    ayrı iletilir ve dinleyici başına bant genişliği konuşmacı sayısıyla
+    artar. Karıştırma modunda oda başına bir görev paketleri sabit bir
+    saatle çözüp karıştırır ve her dinleyiciye kendi codec'iyle tek bir akış
+    gönderir. Saat periyodu istemcilerin paket süresidir (1024 örnek /
+    44.1 kHz ≈ 23.2 ms); başka bir periyot paketlerin yeniden bölünmesini
+    gerektirirdi. Kimse konuşmuyorsa saat durur, ilk
+    paketle bir periyot geriden yeniden başlar.
+
+    Çözme, karıştırma ve kodlama (mix_frames) olay döngüsünde değil
+    executor'da çalışır; karıştırılan odalar diğer odaların ses dağıtımını
+    ve sinyalleşmeyi bekletmez. Varsayılan tek thread'lik bir havuzdur;
+    CPU'yu da ayırmak için bir ProcessPoolExecutor verilebilir.
+    """
+
+    def __init__(self, fanout, listeners, frame_count=1024, rate=44100, depth=3, executor=None):
+        self.fanout = fanout
+        # listeners(oda adı) -> bu süreçteki dinleyiciler [(sid, gönderen indeksi, codec adı)]
+        self.listeners = listeners
+        self.frame_count = frame_count
+        self.period = frame_count / rate
+        self.depth = depth
+        self.rooms = {}  # {oda adı: RoomMixer}
+        self.owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='audio-mixer')
+        self.stats = {'frames_decoded': 0, 'decode_errors': 0}
+
+    def get_mode(self, room_name):
+        return MODE_MIX if room_name in self.rooms else MODE_FORWARD
+
+    def is_mixing(self, room_name):
+        return room_name in self.rooms
+
+    def set_mode(self, room_name, stream_id, mode):
+        """Odanın dağıtım modunu değiştir (karıştırma modunda saati başlatır)"""
+        if mode == MODE_MIX and room_name not in self.rooms:
+            room = self.rooms[room_name] = RoomMixer(stream_id, self.frame_count, self.depth)
+            room.task = asyncio.get_running_loop().create_task(self._clock(room_name, room))
+        elif mode == MODE_FORWARD:
+            self.discard(room_name)
+
+    def push(self, room_name, frame):
+        """Ses paketini odanın karıştırıcısına ver (çözülmesi saat vuruşunda)"""
+        room = self.rooms.get(room_name)
+        if room is None:
+            return
+        try:
+            audio_frame = protocol.unpack_frame(frame)
+        except (ValueError, struct.error):
+            self.stats['decode_errors'] += 1
+            return
+        room.push(audio_frame.sender, audio_frame.codec_id, audio_frame.payload, audio_frame.level)
+
+    def remove_member(self, room_name, member_id):
+        room = self.rooms.get(room_name)
+        if room is not None:
+            room.remove(member_id)
+
+    def discard(self, room_name):
+        """Odanın karıştırıcısını durdur (oda ileti moduna döner)"""
+        room = self.rooms.pop(room_name, None)
+        if room is not None and room.task is not None:
+            room.task.cancel()
+
+    def stop(self):
+        for room_name in list(self.rooms):
+            self.discard(room_name)
+        if self.owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            'period_ms': round(self.period * 1000, 3),
+            'rooms': {room_name: room.get_stats() for room_name, room in self.rooms.items()}
+        }
+
+    async def _clock(self, room_name, room):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            if not room.pending():
+                room.wake.clear()
+                await room.wake.wait()
+                # Bir periyot beklemek diğer konuşmacıların paketlerine ve
+                # ağ titreşimine pay bırakır
+                deadline = loop.time() + self.period
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+
+            contributions = room.take()
+            if contributions:
+                result = await loop.run_in_executor(self.executor, mix_frames,
+                                                    *room.job(contributions, self.listeners(room_name)))
+                self.stats['frames_decoded'] += len(contributions) - result[1]
+                self.stats['decode_errors'] += result[1]
+                groups = room.record(result)
+                if groups:
+                    await asyncio.gather(*(self.fanout.broadcast('audio_data', frame, sids)
+                                           for frame, sids in groups))
+
+            deadline += self.period
+            if loop.time() - deadline > self.period:
+                room.stats['late_ticks'] += 1
+                deadline = loop.time()
@@ -0,0 +1,175 @@
+import asyncio
+from collections import deque
+
+import socketio
+
+# Gönderim öncelikleri (küçük olan önce gönderilir)
+PRIORITY_CONTROL = 0  # Presence, oda olayları, yönlendirmeler: hiç bırakılmaz
+PRIORITY_CHAT = 1  # Sohbet mesajları: hiç bırakılmaz
+PRIORITY_AUDIO = 2  # Ses paketleri: kuyruk dolunca en eskisi bırakılır
+
+# Sohbet önceliğiyle gönderilen olaylar (diğer bütün olaylar kontrol önceliğinde)
+CHAT_EVENTS = {'new_message'}
+
+
+def event_priority(eio_pkt):
+    """Socket.IO olay paketinin önceliği (olay adı paketin başından okunur)"""
+    data = eio_pkt.data
+    if isinstance(data, str) and data.startswith('2'):
+        start = data.find('["')
+        if start != -1 and data[start + 2:data.find('"', start + 2)] in CHAT_EVENTS:
+            return PRIORITY_CHAT
+    # İkili olayların ekleri başlıklarıyla aynı kuyrukta kalmalı
+    return PRIORITY_CONTROL
+
+
+class ClientQueue:
+    """Tek bir bağlantının öncelikli gönderim kuyrukları"""
+
+    def __init__(self, eio_sid, limits):
+        self.eio_sid = eio_sid
+        self.limits = limits
+        self.queues = tuple(deque() for _ in limits)  # Öncelik başına [(eklenme anı, paketler)]
+        self.ready = asyncio.Event()
+        self.task = None
+
+        self.stats = {
+            'sent': 0,
+            'audio_dropped': 0,
+            'max_depth': 0,
+            'latency_ms': 0.0,  # Kuyruğa girişten Engine.IO'ya teslime kadar (üstel ortalama)
+            'max_latency_ms': 0.0
+        }
+
+    def depth(self):
+        return sum(len(queue) for queue in self.queues)
+
+    def put(self, priority, packets, now):
+        """Paketleri kuyruğa ekle; kontrol ya da sohbet kuyruğu taşarsa False"""
+        queue = self.queues[priority]
+        if len(queue) >= self.limits[priority]:
+            if priority != PRIORITY_AUDIO:
+                return False
+            queue.popleft()  # Geç kalan ses işe yaramaz: en eski paket bırakılır
+            self.stats['audio_dropped'] += 1
+        queue.append((now, packets))
+        self.stats['max_depth'] = max(self.stats['max_depth'], self.depth())
+        self.ready.set()
+        return True
+
+    def pop(self):
+        for queue in self.queues:
+            if queue:
+                return queue.popleft()
+        return None
+
+    def sent(self, latency):
+        latency_ms = latency * 1000
+        self.stats['sent'] += 1
+        self.stats['latency_ms'] += (latency_ms - self.stats['latency_ms']) / 16
+        self.stats['max_latency_ms'] = max(self.stats['max_latency_ms'], round(latency_ms, 3))
+
+    def get_stats(self, now):
+        # Takılan bir bağlantı hiçbir paketi teslim edemediği için gecikmesi
+        # en eski bekleyen paketin yaşından görülür
+        oldest = min((queue[0][0] for queue in self.queues if queue), default=now)
+        return {
+            **self.stats,
+            'latency_ms': round(self.stats['latency_ms'], 3),
+            'depth': [len(queue) for queue in self.queues],
+            'oldest_ms': round((now - oldest) * 1000, 3)
+        }
+
+
+class OutboundQueues:
+    """Bağlantı başına sınırlı gönderim kuyrukları ve yazma görevleri.
+
+    Gönderen taraf hiç beklemez: paketler alıcının kuyruğuna eklenir ve her
+    bağlantının kendi görevi onları öncelik sırasıyla Engine.IO'ya verir.
+    Görev bir sonraki paketi, Engine.IO'nun yazarı öncekini soketten alana
+    kadar vermez; böylece yavaş bir bağlantının birikmesi Engine.IO'nun
+    sınırsız kuyruğunda değil burada, sınırlı olarak olur ve yavaş alıcı
+    odadaki diğerlerini geciktirmez. Ses kuyruğu dolunca en eski paket
+    bırakılır. Kontrol ya da sohbet kuyruğu dolan bağlantı kurtarılamayacak
+    kadar geride demektir ve kapatılır.
+    """
+
+    def __init__(self, sio, max_control=1000, max_chat=1000, max_audio=8):
+        self.sio = sio
+        self.limits = (max_control, max_chat, max_audio)
+        self.clients = {}  # {eio_sid: ClientQueue}
+        self.stats = {'slow_disconnects': 0}
+
+    def put(self, eio_sid, packets, priority):
+        """Engine.IO paketlerini alıcının kuyruğuna ekle (bloklamaz)"""
+        client = self.clients.get(eio_sid)
+        if client is None:
+            if eio_sid not in self.sio.eio.sockets:
+                return
+            client = self.clients[eio_sid] = ClientQueue(eio_sid, self.limits)
+            client.task = asyncio.get_running_loop().create_task(self._write(client))
+        if not client.put(priority, packets, asyncio.get_running_loop().time()):
+            print(f"Gönderim kuyruğu doldu, bağlantı kapatılıyor: {eio_sid}")
+            self.stats['slow_disconnects'] += 1
+            self.remove(eio_sid)
+            asyncio.get_running_loop().create_task(self.sio.eio.disconnect(eio_sid))
+
+    def remove(self, eio_sid):
+        """Kapanan bağlantının kuyruğunu ve görevini bırak"""
+        client = self.clients.pop(eio_sid, None)
+        if client is not None and client.task is not None:
+            client.task.cancel()
+
+    def stop(self):
+        for eio_sid in list(self.clients):
+            self.remove(eio_sid)
+
+    def get_stats(self):
+        clients = list(self.clients.values())
+        now = asyncio.get_running_loop().time()
+        return {
+            **self.stats,
+            'connections': len(clients),
+            'queued': sum(client.depth() for client in clients),
+            'audio_dropped': sum(client.stats['audio_dropped'] for client in clients),
+            # Bağlantılar Socket.IO sid'leriyle gösterilir
+            'clients': {self.sio.manager.sid_from_eio_sid(client.eio_sid, '/') or client.eio_sid: client.get_stats(now)
+                        for client in clients}
+        }
+
+    async def _write(self, client):
+        loop = asyncio.get_running_loop()
+        eio = self.sio.eio
+        while True:
+            item = client.pop()
+            if item is None:
+                client.ready.clear()
+                await client.ready.wait()
+                continue
+            enqueued, packets = item
+            for eio_pkt in packets:
+                await eio.send_packet(client.eio_sid, eio_pkt)
+            socket = eio.sockets.get(client.eio_sid)
+            if socket is None:
+                self.clients.pop(client.eio_sid, None)
+                return
+            # Engine.IO'nun yazarı paketi kuyruğundan alana kadar bekle
+            await socket.queue.join()
+            client.sent(loop.time() - enqueued)
+
+
+class QueuedAsyncServer(socketio.AsyncServer):
+    """Olayları bağlantı başına kuyruklar üzerinden gönderen Socket.IO server'ı.
+
+    Manager'ın odalara ve tek tek bağlantılara gönderdiği olaylar (çok
+    süreçli modda diğer worker'lardan gelenler dahil) _send_eio_packet'ten
+    geçer; burada beklemeden alıcının kuyruğuna eklenir. Olay yanıtları
+    (ack) doğrudan gönderilir.
+    """
+
+    def __init__(self, *args, queue_limits=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbound = OutboundQueues(self, **(queue_limits or {}))
+
+    async def _send_eio_packet(self, eio_sid, eio_pkt):
+        self.outbound.put(eio_sid, [eio_pkt], event_priority(eio_pkt))
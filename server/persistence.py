@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+
+class MessageWriter:
+    """Sohbet mesajlarını olay döngüsünü bloklamadan toplu halde yazar.
+
+    Mesajlar sınırlı bir asyncio kuyruğunda birikir. Arka plandaki görev
+    kuyruğu `batch_size` mesaja ulaşınca ya da ilk mesajdan sonra
+    `flush_interval` saniye geçince tek bir transaction ile depolamaya yazar.
+    Kuyruk doluysa gönderen, yer açılana kadar bekler. Yazılan mesajların
+    veritabanı id'leri on_written([(oda adı, kullanıcı adı, zaman, id)])
+    ile bildirilir (async).
+    """
+
+    def __init__(self, db, batch_size=100, flush_interval=0.05, max_queue=10000, on_written=None):
+        self.db = db
+        self.on_written = on_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.task = None
+
+        self.stats = {
+            'written': 0,
+            'batches': 0,
+            'failed': 0,
+            'last_commit_ms': 0.0,
+            'max_commit_ms': 0.0,
+            'total_commit_ms': 0.0
+        }
+
+    def start(self):
+        """Yazma görevini başlat"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def put(self, room_name, username, content, timestamp):
+        """Mesajı yazma kuyruğuna ekle"""
+        await self.queue.put((room_name, username, content, timestamp))
+
+    async def flush(self):
+        """Şu ana kadar kuyruğa alınan mesajlar yazılana kadar bekle"""
+        if self.task is not None:
+            await self.queue.join()
+
+    async def stop(self):
+        """Kuyrukta kalan her şeyi yaz ve görevi kapat"""
+        if self.task is not None:
+            await self.queue.join()
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def get_stats(self):
+        """Kuyruk derinliği ve commit süreleri"""
+        batches = self.stats['batches']
+        return {
+            **self.stats,
+            'total_commit_ms': round(self.stats['total_commit_ms'], 3),
+            'queue_depth': self.queue.qsize(),
+            'avg_commit_ms': round(self.stats['total_commit_ms'] / batches, 3) if batches else 0.0
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch):
+        start = time.perf_counter()
+        ids = None
+        try:
+            ids = await self.db.add_messages(batch)
+            self.stats['written'] += len(batch)
+        except Exception as e:
+            self.stats['failed'] += len(batch)
+            print(f"Mesaj yazma hatası: {e}")
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stats['batches'] += 1
+        self.stats['last_commit_ms'] = round(elapsed, 3)
+        self.stats['max_commit_ms'] = max(self.stats['max_commit_ms'], round(elapsed, 3))
+        self.stats['total_commit_ms'] += elapsed
+        try:
+            # flush() bekleyenler id'ler dağıtıldıktan sonra devam eder
+            if ids and self.on_written is not None:
+                await self.on_written([(room_name, username, timestamp, message_id)
+                                       for (room_name, username, _, timestamp), message_id in zip(batch, ids)
+                                       if message_id is not None])
+        except Exception as e:
+            print(f"Mesaj id'leri bildirilemedi: {e}")
+        finally:
+            for _ in batch:
+                self.queue.task_done()
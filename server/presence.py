@@ -0,0 +1,102 @@
+import asyncio
+
+
+class PresenceAggregator:
+    """Oda üyelik değişikliklerini toplayıp tek presence_delta olarak gönderir.
+
+    Server yeniden başladığında ya da ağ kısa süre koptuğunda bütün
+    istemciler aynı anda yeniden bağlanır. Her katılım/ayrılma odaya ayrı
+    ayrı duyurulsaydı n kişilik bir oda için n² olay giderdi. Bunun yerine
+    bir odanın değişiklikleri ilk değişiklikten itibaren `window` saniye
+    biriktirilir ve tek olayda gönderilir:
+
+      - Pencere içinde aynı üyeye ait değişiklikler son duruma indirgenir;
+        katılıp hemen ayrılan biri hiç duyurulmaz.
+      - Aynı kullanıcı adıyla eski kimlik ayrılıp yeni kimlik katıldıysa
+        (yeniden bağlanma) katılan kayda 'replaces' alanı eklenir; istemci
+        bunu ayrılma/katılma bildirimi olarak göstermez.
+    """
+
+    def __init__(self, sio, room_manager, window=0.15):
+        self.sio = sio
+        self.room_manager = room_manager
+        self.window = window
+        # {oda adı: {'from_version': sürüm, 'changes': {üye kimliği: [başta var mı, şimdi var mı, ad]},
+        #            'timer': TimerHandle}}
+        self.pending = {}
+
+        self.stats = {
+            'events_received': 0,  # Kuyruğa alınan tek tek değişiklikler
+            'events_merged': 0,  # Bekleyen bir presence_delta'ya eklenenler
+            'events_sent': 0,  # Gönderilen presence_delta sayısı
+            'reconnects_merged': 0  # Ayrılma + katılma yerine tek kayıtla bildirilenler
+        }
+
+    def queue(self, room_name, member_id, username, present, was_present):
+        """Üyelik değişikliğini odanın bekleyen presence_delta'sına ekle.
+
+        Oda üyeliği değiştirildikten hemen sonra çağrılmalıdır.
+        """
+        self.stats['events_received'] += 1
+        pending = self.pending.get(room_name)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = self.pending[room_name] = {
+                # Her değişiklik sürümü bir artırır; bu değişiklikten önceki sürüm
+                'from_version': self.room_manager.get_version(room_name) - 1,
+                'changes': {},
+                'timer': loop.call_later(
+                    self.window, lambda: asyncio.create_task(self.flush(room_name)))
+            }
+        else:
+            self.stats['events_merged'] += 1
+        change = pending['changes'].get(member_id)
+        if change is None:
+            pending['changes'][member_id] = [was_present, present, username]
+        else:
+            change[1] = present
+            change[2] = username
+
+    async def flush(self, room_name):
+        """Odanın bekleyen üyelik değişikliklerini tek olayda gönder"""
+        pending = self.pending.pop(room_name, None)
+        if pending is None or not self.room_manager.room_exists(room_name):
+            return
+        joined, left = [], []
+        left_by_name = {}  # {ad: [ayrılan kimlikler]}
+        for member_id, (was_present, present, username) in pending['changes'].items():
+            if present:
+                joined.append({'id': member_id, 'username': username})  # Yeni ya da güncellenmiş
+            elif was_present:
+                left.append(member_id)
+                left_by_name.setdefault(username, []).append(member_id)
+
+        # Yeniden bağlanma: aynı adla ayrılan eski kimliği yeni kayda bağla
+        for member in joined:
+            old_ids = left_by_name.get(member['username'])
+            if old_ids and not pending['changes'][member['id']][0]:
+                member['replaces'] = old_ids.pop()
+                self.stats['reconnects_merged'] += 1
+
+        # Değişiklikler birbirini götürse bile sürüm ilerlediği için olay gönderilir
+        self.stats['events_sent'] += 1
+        await self.sio.emit('presence_delta', {
+            'room': room_name,
+            'from_version': pending['from_version'],
+            'version': self.room_manager.get_version(room_name),
+            'joined': joined,
+            'left': left
+        }, room=room_name)
+
+    def discard(self, room_name):
+        """Silinen odanın bekleyen değişikliklerini gönderme"""
+        pending = self.pending.pop(room_name, None)
+        if pending is not None:
+            pending['timer'].cancel()
+
+    def stop(self):
+        for room_name in list(self.pending):
+            self.discard(room_name)
+
+    def get_stats(self):
+        return {**self.stats, 'pending_rooms': len(self.pending)}
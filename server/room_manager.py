@@ -1,41 +1,201 @@
+import time
+
+
+class Room:
+    """Bir odanın üyeleri.
+
+    Üyeler sıralı bir dizide tutulur (ses dağıtımı doğrudan bu diziyi
+    dolaşır), kullanıcı adları ve üye kimlikleri (ses paketlerindeki gönderen
+    indeksi) de aynı sırada ayrı dizilerde önbelleklenir. Çıkarma işleminde
+    son eleman boşalan yere taşındığı için ekleme ve çıkarma O(1)'dir.
+
+    Her üyelik değişikliği version'ı artırır; istemciler katılırken aldıkları
+    anlık görüntüyü bu sürümden itibaren gelen değişikliklerle günceller.
+    """
+
+    __slots__ = ('name', 'members', 'usernames', 'member_ids', 'positions', 'version', '_snapshot')
+
+    def __init__(self, name):
+        self.name = name
+        self.members = []  # [sid]
+        self.usernames = []  # members ile aynı sırada kullanıcı adları
+        self.member_ids = []  # members ile aynı sırada üye kimlikleri
+        self.positions = {}  # {sid: members içindeki indeks}
+        self.version = 0
+        self._snapshot = None
+
+    def __contains__(self, sid):
+        return sid in self.positions
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, sid, username, member_id=None):
+        self.version += 1
+        self._snapshot = None
+        if sid in self.positions:
+            index = self.positions[sid]
+            self.usernames[index] = username
+            self.member_ids[index] = member_id
+            return
+        self.positions[sid] = len(self.members)
+        self.members.append(sid)
+        self.usernames.append(username)
+        self.member_ids.append(member_id)
+
+    def remove(self, sid):
+        index = self.positions.pop(sid, None)
+        if index is None:
+            return False
+        self.version += 1
+        self._snapshot = None
+        last_sid = self.members.pop()
+        last_username = self.usernames.pop()
+        last_id = self.member_ids.pop()
+        if index < len(self.members):
+            self.members[index] = last_sid
+            self.usernames[index] = last_username
+            self.member_ids[index] = last_id
+            self.positions[last_sid] = index
+        return True
+
+    def snapshot(self):
+        """Üye listesi ve sürümü (aynı sürüm için bir kez oluşturulur)"""
+        if self._snapshot is None:
+            self._snapshot = {
+                'version': self.version,
+                'members': [{'id': member_id, 'username': username}
+                            for member_id, username in zip(self.member_ids, self.usernames)]
+            }
+        return self._snapshot
+
+
 class RoomManager:
-    def __init__(self):
-        self.rooms = {
-            'Genel Sohbet': set(),
-            'Oyun Odası': set(),
-            'Müzik Odası': set()
-        }
-    
-    def add_user_to_room(self, room_name, user_sid):
-        """Kullanıcıyı odaya ekle"""
-        if room_name in self.rooms:
-            self.rooms[room_name].add(user_sid)
-            return True
-        return False
-    
+    """Oda üyeliklerinin tek kaynağı.
+
+    Her bağlantı en fazla bir odadadır; sid -> oda ters indeksi sayesinde
+    katılma, ayrılma ve bağlantı kopması oda sayısından bağımsız olarak O(1)
+    çalışır. Bellekte sadece etkin odalar bulunur: oda ilk katılımda
+    oluşturulur, boşaldıktan sonra idle_ttl saniye kimse gelmezse
+    evict_idle() ile bırakılır.
+    """
+
+    def __init__(self, room_names=(), idle_ttl=300):
+        self.rooms = {}  # {oda adı: Room}
+        self.user_rooms = {}  # {sid: oda adı}
+        self.idle_since = {}  # {boş oda adı: boşaldığı an}
+        self.idle_ttl = idle_ttl
+        for room_name in room_names:
+            self.add_room(room_name)
+
+    def add_room(self, room_name):
+        """Oda bellekte yoksa oluştur"""
+        room = self.rooms.get(room_name)
+        if room is None:
+            room = self.rooms[room_name] = Room(room_name)
+            self.idle_since[room_name] = time.monotonic()
+        return room
+
+    def discard_room(self, room_name):
+        """Odayı bellekten kaldır; içindeki bağlantıları döndürür"""
+        room = self.rooms.pop(room_name, None)
+        self.idle_since.pop(room_name, None)
+        if room is None:
+            return []
+        for user_sid in room.members:
+            del self.user_rooms[user_sid]
+        return room.members
+
+    def idle_rooms(self, now=None):
+        """idle_ttl süresinden uzun süredir boş olan odalar"""
+        now = time.monotonic() if now is None else now
+        return [room_name for room_name, since in self.idle_since.items()
+                if now - since >= self.idle_ttl]
+
+    def evict_idle(self, now=None):
+        """idle_ttl süresinden uzun süredir boş olan odaları bırak"""
+        evicted = self.idle_rooms(now)
+        for room_name in evicted:
+            del self.rooms[room_name]
+            del self.idle_since[room_name]
+        return evicted
+
+    def add_user_to_room(self, room_name, user_sid, username, member_id=None):
+        """Kullanıcıyı odaya ekle (önceki odasından çıkarılmış olmalı; oda
+        bellekte yoksa oluşturulur)"""
+        self.add_room(room_name).add(user_sid, username, member_id)
+        self.user_rooms[user_sid] = room_name
+        self.idle_since.pop(room_name, None)
+        return True
+
     def remove_user_from_room(self, room_name, user_sid):
         """Kullanıcıyı odadan çıkar"""
-        if room_name in self.rooms:
-            self.rooms[room_name].discard(user_sid)
-            return True
-        return False
-    
+        if self.user_rooms.get(user_sid) != room_name:
+            return False
+        self.remove_user_from_all_rooms(user_sid)
+        return True
+
     def remove_user_from_all_rooms(self, user_sid):
-        """Kullanıcıyı tüm odalardan çıkar"""
-        for room in self.rooms.values():
-            room.discard(user_sid)
-    
+        """Kullanıcıyı bulunduğu odadan çıkar; çıktığı odanın adını döndürür"""
+        room_name = self.user_rooms.pop(user_sid, None)
+        if room_name is not None:
+            room = self.rooms[room_name]
+            room.remove(user_sid)
+            if not room.members:
+                self.idle_since[room_name] = time.monotonic()
+        return room_name
+
     def get_room_users(self, room_name):
-        """Odadaki kullanıcıları getir"""
-        return list(self.rooms.get(room_name, set()))
-    
+        """Odadaki bağlantılar (sıralı dizi; değiştirilmemelidir)"""
+        room = self.rooms.get(room_name)
+        return room.members if room is not None else []
+
+    def get_room_usernames(self, room_name):
+        """Odadaki kullanıcı adları (get_room_users ile aynı sırada)"""
+        room = self.rooms.get(room_name)
+        return room.usernames if room is not None else []
+
+    def get_snapshot(self, room_name):
+        """Odanın sürümlü üye listesi"""
+        room = self.rooms.get(room_name)
+        return room.snapshot() if room is not None else {'version': 0, 'members': []}
+
+    def get_version(self, room_name):
+        room = self.rooms.get(room_name)
+        return room.version if room is not None else 0
+
+    def get_member(self, room_name, user_sid):
+        """Üyenin (kimlik, kullanıcı adı) ikilisi (odada değilse None)"""
+        room = self.rooms.get(room_name)
+        if room is None or user_sid not in room.positions:
+            return None
+        index = room.positions[user_sid]
+        return room.member_ids[index], room.usernames[index]
+
+    def get_member_ids(self, room_name):
+        """Odadaki üye kimlikleri (get_room_users ile aynı sırada)"""
+        room = self.rooms.get(room_name)
+        return room.member_ids if room is not None else []
+
+    def has_member_id(self, room_name, member_id):
+        """Odada bu üye kimliğine sahip biri var mı"""
+        room = self.rooms.get(room_name)
+        return room is not None and member_id in room.member_ids
+
     def get_user_room(self, user_sid):
-        """Kullanıcının bulunduğu odayı bul"""
-        for room_name, users in self.rooms.items():
-            if user_sid in users:
-                return room_name
-        return None
-    
+        """Kullanıcının bulunduğu oda (yoksa None)"""
+        return self.user_rooms.get(user_sid)
+
+    def is_in_room(self, room_name, user_sid):
+        return self.user_rooms.get(user_sid) == room_name
+
     def room_exists(self, room_name):
-        """Oda var mı kontrol et"""
+        """Oda bellekte (etkin) mi kontrol et"""
         return room_name in self.rooms
+
+    def get_stats(self):
+        return {
+            'active_rooms': len(self.rooms),
+            'occupied_rooms': len(self.rooms) - len(self.idle_since),
+            'members': len(self.user_rooms)
+        }
@@ -1,26 +1,115 @@
-import socketio
+import sys
+import argparse
+import asyncio
+import heapq
 from aiohttp import web
 from datetime import datetime
+from pathlib import Path
 from database import Database
+from fanout import AudioFanout
+from persistence import MessageWriter
+from history_cache import RoomHistoryCache, serialize_message
+from maintenance import MaintenanceTask, retention_policy
+from room_manager import RoomManager
+from presence import PresenceAggregator
+from speakers import SpeakerSelector
+from bus import BusManager
+from outbound import QueuedAsyncServer
+
+# common paketini bulabilmek için proje kök dizinini ekle
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.codec import negotiate_codec, DEFAULT_CODEC
+from common import protocol
+from mixer import AudioMixer, AUDIO_MODES
 
 class VoiceChatServer:
-    def __init__(self):
+    # fetch_history ile tek seferde gönderilebilecek en fazla mesaj
+    MAX_HISTORY_PAGE = 100
+    # search_messages sayfa boyutu üst sınırı
+    MAX_SEARCH_PAGE = 50
+    # list_rooms sayfa boyutu üst sınırı
+    MAX_ROOM_PAGE = 200
+    MAX_ROOM_NAME = 64
+
+    def __init__(self, history_size=50, retention=None, storage=None, room_idle_ttl=300, presence_window=0.15,
+                 workers=None, cluster=None, max_speakers=None):
         print("Server başlatılıyor...")  # Yeni log
-        self.sio = socketio.AsyncServer(cors_allowed_origins='*', async_mode='aiohttp')
+        # Çok süreçli modda (workers.WorkerGroup) olaylar diğer worker'lara
+        # mesaj yolu üzerinden ulaşır; her bağlantı tek bir TCP akışı olarak
+        # kabul edildiği worker'da kalmalıdır, bu yüzden sadece WebSocket
+        self.workers = workers
+        options = {}
+        if workers is not None:
+            options = {'client_manager': BusManager(workers.bus), 'transports': ['websocket']}
+        # Her bağlantının kendi sınırlı gönderim kuyruğu ve yazma görevi vardır;
+        # yavaş bir alıcı odadaki diğerlerini bekletmez
+        self.sio = QueuedAsyncServer(cors_allowed_origins='*', async_mode='aiohttp', **options)
+        self.outbound = self.sio.outbound
         self.app = web.Application()
         self.sio.attach(self.app)
         print("Socket.IO server oluşturuldu")  # Yeni log
 
         # Test endpoint'i ekle
         self.app.router.add_get('/', self.handle_index)
+        self.app.router.add_get('/stats', self.handle_stats)
 
         self.users = {}  # {sid: username}
-        self.rooms = {
-            'Genel Sohbet': set(),
-            'Oyun Odası': set(),
-            'Müzik Odası': set()
+        # Oda üyelikleri; odalar ilk katılımda bellekte oluşturulur, boş
+        # kaldıktan room_idle_ttl saniye sonra bırakılır
+        self.room_manager = RoomManager(idle_ttl=room_idle_ttl)
+        self.room_reaper = None
+        # Katılma/ayrılmalar presence_window saniye toplanıp tek olayda duyurulur
+        self.presence = PresenceAggregator(self.sio, self.room_manager, presence_window)
+        # Ses paketleri sadece en yüksek sesli max_speakers konuşmacı (ve
+        # öncelikli üyeler) için iletilir; None ise herkesinki iletilir
+        self.speakers = SpeakerSelector(self.sio, max_speakers, announces=self.owns_room)
+        # Depolama: varsayılan yerel SQLite; başka bir Storage verilebilir
+        self.db = storage or Database()
+
+        # Bilinen tüm odalar ve ikili ses paketlerindeki sayısal kimlikleri
+        # (start() içinde depolamadan doldurulur)
+        self.room_ids = {}  # {oda adı: veritabanı id'si}
+        # Veritabanı id'leri sınırsız artar, paket başlığındaki stream_id ise
+        # 16 bittir; odalara ayrı kimlikler verilir, silinen odanınki yeniden
+        # kullanılır. Tüm worker'lar değişiklikleri aynı sırayla uyguladığı için
+        # aynı kimlikleri verir
+        self.stream_ids = {}  # {oda adı: stream_id}
+        self.room_names = {}  # {stream_id: oda adı}
+        self.free_stream_ids = []  # Boşalan kimlikler (en küçüğü önce)
+        self.next_stream_id = 1
+        self.sender_ids = {}  # {sid: gönderen indeksi}
+        self.codecs = {}  # {sid: odaya katılırken belirlenen codec}
+        # Worker'lar gönderen indekslerini çakışmayacak şekilde adım adım dağıtır
+        self.sender_id_start = workers.index + 1 if workers is not None else 1
+        self.sender_id_step = workers.count if workers is not None else 1
+        self.next_sender_id = self.sender_id_start
+
+        # Ses trafiği sayaçları (/stats üzerinden görülebilir)
+        self.audio_stats = {
+            'frames_received': 0,
+            'frames_forwarded': 0,
+            'suppressed_frames': 0,  # İstemcilerin sessizlik nedeniyle göndermediği paketler
+            'frames_filtered': 0,  # Etkin konuşmacı olmayanların iletilmeyen paketleri
+            'keepalives': 0
         }
-        self.db = Database()
+
+        self.fanout = AudioFanout(self.sio, outbound=self.outbound)
+        # Karıştırma modundaki odalarda dinleyicilere tek, karışık akış gider
+        self.mixer = AudioMixer(self.fanout, self.mix_listeners)
+        self.message_writer = MessageWriter(self.db, on_written=self.messages_written)
+
+        # Odaya katılanlara gönderilen son mesajlar bellekte tutulur
+        self.history = RoomHistoryCache(history_size)
+
+        # Saklama süresi dolan mesajları arşivleyen ve veritabanını toparlayan görev
+        self.maintenance = MaintenanceTask(self.db, retention, on_archived=self.history_archived)
+        self.runner = None
+        if workers is not None:
+            workers.bind(self.apply_state, self.receive_remote_audio)
+        # Küme modunda (cluster.ClusterNode) her oda tek bir düğümdedir
+        self.cluster = cluster
+        if cluster is not None:
+            cluster.attach(self)
         self.setup_events()
 
     def setup_events(self):
@@ -30,61 +119,83 @@ class VoiceChatServer:
 
         @self.sio.event
         async def disconnect(sid):
+            eio_sid = self.sio.manager.eio_sid_from_sid(sid, '/')
+            if eio_sid is not None:
+                self.outbound.remove(eio_sid)
             if sid in self.users:
                 username = self.users[sid]
-                # Kullanıcıyı tüm odalardan çıkar
-                for room_name, users in self.rooms.items():
-                    if sid in users:
-                        users.discard(sid)
-                        await self.sio.emit('user_left', {
-                            'username': username,
-                            'room': room_name
-                        }, room=room_name)
+                # Kullanıcıyı bulunduğu odadan çıkar
+                await self.replicate('leave', sid)
                 del self.users[sid]
+                self.sender_ids.pop(sid, None)
+                self.codecs.pop(sid, None)
                 print(f'Client ayrıldı: {username} ({sid})')
 
         @self.sio.event
         async def login(sid, username):
             print(f'[LOG] Kullanıcı girişi: {username} (SID: {sid})')  # Log eklendi
             self.users[sid] = username
+            # Odadayken yeniden giriş yapılırsa önbellekteki adı güncelle
+            if self.room_manager.get_user_room(sid) is not None:
+                await self.replicate('rename', sid, username)
             return {'status': 'success'}
 
         @self.sio.event
-        async def join_room(sid, room_name):
+        async def join_room(sid, data):
+            # Eski istemciler sadece oda adını gönderir
+            if isinstance(data, dict):
+                room_name = data.get('room')
+                offered_codecs = data.get('codecs', [])
+                redirected = data.get('redirected', False)
+            else:
+                room_name = data
+                offered_codecs = []
+                redirected = False
             print(f'[LOG] Oda katılma isteği: {room_name} (SID: {sid})')  # Log eklendi
-            if room_name in self.rooms:
+            if room_name in self.stream_ids:
+                # Oda başka düğümdeyse istemci oraya yönlendirilir. Yönlendirilerek
+                # gelen istek düğümlerin görünümleri henüz aynı olmasa da kabul
+                # edilir, yoksa istemci iki düğüm arasında gidip gelebilirdi
+                if self.cluster is not None and not redirected and not self.cluster.owns(room_name):
+                    return self.cluster.redirect(room_name)
+
                 username = self.users[sid]
                 print(f'[LOG] {username} kullanıcısı {room_name} odasına katılıyor')  # Log eklendi
 
-                # Önce diğer odalardan çık
-                for old_room, users in self.rooms.items():
-                    if sid in users:
-                        users.discard(sid)
-                        await self.sio.emit('user_left', {
-                            'username': username,
-                            'room': old_room
-                        }, room=old_room)
-                        await self.sio.leave_room(sid, old_room)  # Eski odadan çık
-
-                # Yeni odaya katıl
+                # Etkin olmayan odanın geçmişi ilk katılımda yüklenir
+                await self.history.load(self.db, room_name)
+
+                # Bulunduğu odadan çıkıp yeni odaya katıl; diğer kullanıcılara
+                # toplu presence_delta ile bildirilir
+                sender_id = self.assign_sender_id(sid)
+                joined, old_room = await self.replicate('join', room_name, sid, username, sender_id)
+                if old_room is not None:
+                    await self.sio.leave_room(sid, old_room)  # Eski odadan çık
+                if not joined:
+                    return {'status': 'error', 'message': 'Oda bulunamadı'}  # Beklerken silindi
                 await self.sio.enter_room(sid, room_name)  # await kaldırıldı
-                self.rooms[room_name].add(sid)
 
-                # Odadaki kullanıcı listesini hazırla
-                room_users = [self.users[user_sid] for user_sid in self.rooms[room_name]]
-
-                # Odadaki diğer kullanıcılara haber ver
-                await self.sio.emit('user_joined', {
-                    'username': username,
-                    'room': room_name
-                }, room=room_name)
+                # Sürümlü üye listesi; istemci sonraki değişiklikleri buna uygular
+                presence = self.room_manager.get_snapshot(room_name)
 
                 print(f'{username} odaya katıldı: {room_name}')
-                print(f'Odadaki kullanıcılar: {room_users}')
+                print(f'Odadaki kullanıcı sayısı: {len(presence["members"])}')
+
+                codec = self.codecs[sid] = negotiate_codec(offered_codecs)
+                print(f'[LOG] {username} için codec: {codec}')
+
+                history = await self.get_history(room_name)
 
                 return {
                     'status': 'success',
-                    'users': room_users  # Kullanıcı listesini gönder
+                    'presence': presence,
+                    'speakers': self.speakers.get_active(room_name),
+                    'audio_mode': self.mixer.get_mode(room_name),
+                    'history': history,  # Yeniden eskiye
+                    'history_cursor': self.history_cursor(history, self.history.size),
+                    'codec': codec,
+                    'stream_id': self.stream_ids[room_name],
+                    'sender_id': sender_id
                 }
 
             print(f"Oda bulunamadı: {room_name}")
@@ -92,41 +203,207 @@ class VoiceChatServer:
 
         @self.sio.event
         async def leave_room(sid, room_name):
-            if room_name in self.rooms and sid in self.rooms[room_name]:
-                username = self.users[sid]
-                self.rooms[room_name].discard(sid)
-
-                # Odadaki diğer kullanıcılara haber ver
-                await self.sio.emit('user_left', {
-                    'username': username,
-                    'room': room_name
-                }, room=room_name)
-
+            if self.room_manager.is_in_room(room_name, sid):
+                await self.replicate('leave', sid)
+                await self.sio.leave_room(sid, room_name)
                 return {'status': 'success'}
             return {'status': 'error', 'message': 'Oda veya kullanıcı bulunamadı'}
 
+        @self.sio.event
+        async def presence_snapshot(sid, data=None):
+            """Bulunulan odanın güncel üye listesi (istemci bir değişikliği
+            kaçırdığını fark ettiğinde ister)"""
+            room_name = self.room_manager.get_user_room(sid)
+            if room_name is None:
+                return {'status': 'error', 'message': 'Odada değilsiniz'}
+            return {'status': 'success', 'room': room_name,
+                    'presence': self.room_manager.get_snapshot(room_name)}
+
         @self.sio.event
         async def audio_data(sid, data):
-            room_name = data['room']
-            if room_name in self.rooms and sid in self.rooms[room_name]:
-                for user_sid in self.rooms[room_name]:
-                    if user_sid != sid:  # Kendisine gönderme
-                        await self.sio.emit('audio_data', {
-                            'audio': data['audio'],
-                            'sender_sid': sid  # Gönderen kişinin ID'sini ekle
-                        }, room=user_sid)
+            """İkili ses paketini odadaki diğer kullanıcılara ilet"""
+            if not isinstance(data, bytes) or len(data) < protocol.HEADER.size:
+                return
+            room_name = self.room_names.get(protocol.read_stream_id(data))
+            if self.room_manager.is_in_room(room_name, sid):
+                self.audio_stats['frames_received'] += 1
+                if protocol.read_flags(data) & protocol.FLAG_SILENCE:
+                    # Sessizlik işaretçisi dinleyicilere iletilmez, sadece sayılır
+                    if len(data) < protocol.HEADER.size + protocol.SILENCE.size:
+                        return  # Yükü eksik işaretçi
+                    suppressed, = protocol.SILENCE.unpack_from(data, protocol.HEADER.size)
+                    self.audio_stats['suppressed_frames'] += suppressed
+                    self.audio_stats['keepalives'] += 1
+                    return
+
+                # Gönderen alanını server'ın atadığı indeksle damgala
+                sender_id = self.sender_ids[sid]
+                frame = protocol.stamp_sender(data, sender_id)
+                if self.workers is not None:
+                    # Dinleyicisi olan worker'lar kendi dinleyicileri için aynı seçimi yapar
+                    self.workers.forward_audio(room_name, self.stream_ids[room_name], frame,
+                                               self.room_manager.get_member_ids(room_name))
+                loudness = protocol.LEVEL_SILENT - protocol.read_level(data)
+                if not self.speakers.update(room_name, sender_id, loudness):
+                    self.audio_stats['frames_filtered'] += 1
+                    return
+                if self.mixer.is_mixing(room_name):
+                    # Dinleyicilere odanın saatiyle karışık akış gönderilir
+                    self.mixer.push(room_name, frame)
+                    return
+                # Paket bir kez kodlanır, bu worker'daki dinleyicilere eşzamanlı gönderilir
+                recipients = [user_sid for user_sid in self.room_manager.get_room_users(room_name)
+                              if user_sid != sid and user_sid in self.users]  # Kendisine gönderme
+                self.audio_stats['frames_forwarded'] += len(recipients)
+                await self.fanout.broadcast('audio_data', frame, recipients)
+
+        @self.sio.event
+        async def set_speaker_priority(sid, data):
+            """Odadaki bir üyenin sesini sıralamaya bakmadan herkese ilet (ya da bunu kaldır)"""
+            room_name = self.room_manager.get_user_room(sid)
+            if room_name is None:
+                return {'status': 'error', 'message': 'Odada değilsiniz'}
+            member_id = data.get('member_id')
+            if not self.room_manager.has_member_id(room_name, member_id):
+                return {'status': 'error', 'message': 'Üye bulunamadı'}
+            await self.replicate('speaker_priority', room_name, member_id, bool(data.get('priority', True)))
+            return {'status': 'success'}
+
+        @self.sio.event
+        async def set_audio_mode(sid, data):
+            """Odanın sesini ayrı ayrı ilet ('forward') ya da server'da karıştır ('mix')"""
+            if sid not in self.users:
+                return {'status': 'error', 'message': 'Giriş yapılmamış'}
+            room_name = data.get('room')
+            mode = data.get('mode')
+            if room_name not in self.room_ids:
+                return {'status': 'error', 'message': 'Oda bulunamadı'}
+            if mode not in AUDIO_MODES:
+                return {'status': 'error', 'message': 'Geçersiz mod'}
+            if self.cluster is not None and not self.cluster.owns(room_name):
+                return self.cluster.redirect(room_name)
+            await self.replicate('audio_mode', room_name, mode)
+            print(f'[LOG] {self.users[sid]} {room_name} odasının ses modunu değiştirdi: {mode}')
+            await self.sio.emit('audio_mode', {'room': room_name, 'mode': mode}, room=room_name)
+            return {'status': 'success', 'mode': mode}
+
+        @self.sio.event
+        async def fetch_history(sid, data=None):
+            """İmleçten daha eski mesajların bir sayfasını getir"""
+            room_name = data.get('room') if isinstance(data, dict) else None
+            if sid not in self.users or not isinstance(room_name, str) or room_name not in self.room_ids:
+                return {'status': 'error', 'message': 'Oda bulunamadı'}
+
+            # Bozuk istekler hata yanıtı alır, işleyicide istisna oluşmaz
+            try:
+                limit = max(1, min(int(data.get('limit', 50)), self.MAX_HISTORY_PAGE))
+                cursor = data.get('cursor') or {}
+                if not isinstance(cursor, dict):
+                    raise ValueError(cursor)
+                before = datetime.fromisoformat(cursor['time']) if cursor.get('time') else None
+                before_id = int(cursor['id']) if cursor.get('id') is not None else None
+            except (TypeError, ValueError):
+                return {'status': 'error', 'message': 'Geçersiz istek'}
+
+            messages = await self.get_history(room_name, limit, before, before_id)
+            return {
+                'status': 'success',
+                'messages': messages,  # Yeniden eskiye
+                'cursor': self.history_cursor(messages, limit)
+            }
+
+        @self.sio.event
+        async def search_messages(sid, data):
+            """Mesajlarda tam metin arama (isteğe bağlı oda filtresi ile)"""
+            if sid not in self.users:
+                return {'status': 'error', 'message': 'Giriş yapılmamış'}
+            query = (data.get('query') or '').strip()
+            room_name = data.get('room')
+            if not query or (room_name is not None and room_name not in self.room_ids):
+                return {'status': 'error', 'message': 'Geçersiz arama'}
+
+            limit = max(1, min(int(data.get('limit', 20)), self.MAX_SEARCH_PAGE))
+            offset = max(0, int(data.get('offset', 0)))
+            results = await self.db.search_messages(query, room_name, limit, offset)
+            return {
+                'status': 'success',
+                'results': [{
+                    **serialize_message(r['username'], r['content'], r['timestamp'], r['id']),
+                    'room': r['room'],
+                    'rank': r['rank']
+                } for r in results],
+                'next_offset': offset + limit if len(results) == limit else None
+            }
+
+        @self.sio.event
+        async def list_rooms(sid, data=None):
+            """Oda adları (isteğe bağlı önek filtresi ile, sayfalı) ve etkin
+            odaların kullanıcı sayıları"""
+            data = data or {}
+            prefix = data.get('prefix') or ''
+            limit = max(1, min(int(data.get('limit', self.MAX_ROOM_PAGE)), self.MAX_ROOM_PAGE))
+            offset = max(0, int(data.get('offset', 0)))
+            names = sorted(name for name in self.room_ids if name.startswith(prefix))
+            page = names[offset:offset + limit]
+            return {
+                'status': 'success',
+                'rooms': [{'name': name, 'users': len(self.room_manager.get_room_users(name))}
+                          for name in page],
+                'next_offset': offset + limit if offset + limit < len(names) else None
+            }
+
+        @self.sio.event
+        async def create_room(sid, data):
+            """Yeni oda oluştur ve kaydet"""
+            if sid not in self.users:
+                return {'status': 'error', 'message': 'Giriş yapılmamış'}
+            room_name = ((data.get('room') if isinstance(data, dict) else data) or '').strip()
+            if not room_name or len(room_name) > self.MAX_ROOM_NAME:
+                return {'status': 'error', 'message': 'Geçersiz oda adı'}
+
+            if room_name not in self.room_ids and not self.stream_id_available():
+                return {'status': 'error', 'message': 'Oda sayısı sınırına ulaşıldı'}
+            if await self.add_room(room_name) is None:
+                return {'status': 'error', 'message': 'Oda zaten var'}
+            print(f'[LOG] {self.users[sid]} yeni oda oluşturdu: {room_name}')
+            if self.cluster is not None:
+                await self.cluster.room_created(room_name)
+            return {'status': 'success', 'room': room_name}
+
+        @self.sio.event
+        async def delete_room(sid, data):
+            """Boş odayı ve mesajlarını sil"""
+            if sid not in self.users:
+                return {'status': 'error', 'message': 'Giriş yapılmamış'}
+            room_name = data.get('room') if isinstance(data, dict) else data
+            if room_name not in self.room_ids:
+                return {'status': 'error', 'message': 'Oda bulunamadı'}
+            if self.cluster is not None and not self.cluster.owns(room_name):
+                return await self.cluster.forward_delete(room_name)
+
+            result = await self.remove_room(room_name, sid)
+            if result['status'] == 'success':
+                print(f'[LOG] {self.users[sid]} odayı sildi: {room_name}')
+                if self.cluster is not None:
+                    await self.cluster.room_deleted(room_name)
+            return result
 
         @self.sio.event
         async def send_message(sid, data):
             """Mesaj gönderme olayı"""
-            if sid in self.users and data.get('room') in self.rooms:
+            if sid in self.users and data.get('room') in self.room_ids:
+                # Küme modunda oda başka düğüme taşınırken gelen mesajlar geride kalmasın
+                if self.cluster is not None and not self.room_manager.is_in_room(data['room'], sid):
+                    return
                 username = self.users[sid]
                 room = data['room']
                 message = data['message']
-                timestamp = datetime.now().strftime("%H:%M:%S")
+                now = datetime.now()
+                timestamp = now.strftime("%H:%M:%S")
 
-                # Mesajı veritabanına kaydet
-                self.db.add_message(room, username, message)
+                # Mesaj arka planda toplu olarak veritabanına yazılır
+                await self.message_writer.put(room, username, message, now)
+                await self.replicate('message', room, serialize_message(username, message, now))
 
                 # Odadaki herkese mesajı gönder
                 await self.sio.emit('new_message', {
@@ -135,31 +412,316 @@ class VoiceChatServer:
                     'timestamp': timestamp
                 }, room=room)
 
-    async def start(self, host='0.0.0.0', port=8080):
+    async def add_room(self, room_name):
+        """Odayı kaydet ve herkese duyur; id'sini döndürür (oda zaten varsa None)"""
+        room_id = await self.db.create_room(room_name)
+        if room_id is None:
+            return None
+        await self.replicate('room_created', room_name, room_id)
+        await self.sio.emit('room_created', {'room': room_name})
+        return room_id
+
+    async def remove_room(self, room_name, sid=None):
+        """Boş odayı ve mesajlarını sil (sid: silen, odada bulunabilecek tek bağlantı)"""
+        if room_name not in self.room_ids:
+            return {'status': 'error', 'message': 'Oda bulunamadı'}
+        # Önce bellekten kaldır ki silme beklenirken kimse katılamasın
+        room_id = await self.replicate('room_deleted', room_name, sid)
+        if room_id is None:
+            return {'status': 'error', 'message': 'Odada başka kullanıcılar var'}
+        if sid is not None:
+            await self.sio.leave_room(sid, room_name)
+        await self.db.delete_room(room_id)
+        await self.sio.emit('room_deleted', {'room': room_name})
+        return {'status': 'success'}
+
+    async def messages_written(self, written):
+        """Yazılan mesajların id'lerini bellekteki geçmişe işle (sayfa imleçleri için)"""
+        await self.replicate('message_ids', written)
+
+    async def history_archived(self, room_name):
+        """Bakım görevi odanın eski mesajlarını arşive taşıdı"""
+        await self.replicate('history_archived', room_name)
+
+    async def replicate(self, op, *args):
+        """Oda durumunu değiştir.
+
+        Tek süreçte değişiklik hemen uygulanır. Çok süreçli modda bütün
+        worker'lara gönderilir ve her biri aynı sırayla uygular; sonuç bu
+        worker'da uygulandığında döner.
+        """
+        if self.workers is None:
+            return await self.apply_state(op, args)
+        return await self.workers.replicate(op, args)
+
+    async def apply_state(self, op, args):
+        """Paylaşılan oda durumundaki bir değişikliği uygula (arada await yok)"""
+        return getattr(self, f'apply_{op}')(*args)
+
+    def apply_join(self, room_name, sid, username, member_id):
+        """(katıldı mı, çıktığı eski oda)"""
+        old_room = self.leave_current_room(sid)
+        if room_name not in self.room_ids:
+            return False, old_room
+        self.room_manager.add_user_to_room(room_name, sid, username, member_id)
+        self.queue_presence(room_name, member_id, username, True, False)
+        return True, old_room
+
+    def apply_leave(self, sid):
+        return self.leave_current_room(sid)
+
+    def apply_rename(self, sid, username):
+        room_name = self.room_manager.get_user_room(sid)
+        if room_name is not None:
+            member_id, _ = self.room_manager.get_member(room_name, sid)
+            self.room_manager.add_user_to_room(room_name, sid, username, member_id)
+            self.queue_presence(room_name, member_id, username, True, True)
+
+    def apply_message(self, room_name, item):
+        self.history.append(room_name, item)
+
+    def apply_message_ids(self, written):
+        for room_name, username, timestamp, message_id in written:
+            self.history.set_id(room_name, username, timestamp.isoformat(), message_id)
+
+    def apply_speaker_priority(self, room_name, member_id, priority):
+        self.speakers.set_priority(room_name, member_id, priority)
+
+    def apply_audio_mode(self, room_name, mode):
+        if room_name in self.stream_ids:
+            self.mixer.set_mode(room_name, self.stream_ids[room_name], mode)
+
+    def apply_room_created(self, room_name, room_id):
+        self.room_ids[room_name] = room_id
+        self.allocate_stream_id(room_name)
+        # Depolamanın id önbelleği de her worker'da güncel olmalı; yoksa diğer
+        # worker'lar bu odanın mesajlarını yazamaz ve okuyamaz
+        self.db.remember_room(room_name, room_id)
+
+    def apply_room_deleted(self, room_name, sid):
+        """Oda silinecekse id'si, silinemezse None (silen dışında kimse olmamalı)"""
+        if room_name not in self.room_ids or any(
+                user_sid != sid for user_sid in self.room_manager.get_room_users(room_name)):
+            return None
+        room_id = self.room_ids.pop(room_name)
+        stream_id = self.stream_ids.pop(room_name, None)
+        if stream_id is not None:
+            del self.room_names[stream_id]
+            heapq.heappush(self.free_stream_ids, stream_id)
+        self.db.forget_room(room_name)
+        self.room_manager.discard_room(room_name)
+        self.history.evict(room_name)
+        self.presence.discard(room_name)
+        self.speakers.discard(room_name)
+        self.mixer.discard(room_name)
+        return room_id
+
+    def apply_history_archived(self, room_name):
+        # Bellekteki geçmiş silinen mesajları içerebilir; gerektiğinde yeniden yüklenir
+        self.history.evict(room_name)
+
+    def apply_evict(self, room_name):
+        if self.room_manager.room_exists(room_name) and not self.room_manager.get_room_users(room_name):
+            self.room_manager.discard_room(room_name)
+            self.history.evict(room_name)
+            self.presence.discard(room_name)
+            self.speakers.discard(room_name)
+            self.mixer.discard(room_name)
+
+    def apply_release(self, room_name):
+        """Başka düğüme devredilen odayı bellekten bırak; içindeki bağlantıları döndürür"""
+        members = list(self.room_manager.discard_room(room_name))
+        self.history.evict(room_name)
+        self.presence.discard(room_name)
+        self.speakers.discard(room_name)
+        self.mixer.discard(room_name)
+        return members
+
+    def leave_current_room(self, sid):
+        """Bağlantıyı bulunduğu odadan çıkar ve değişikliği kuyruğa al"""
+        room_name = self.room_manager.get_user_room(sid)
+        if room_name is None:
+            return None
+        member_id, username = self.room_manager.get_member(room_name, sid)
+        self.room_manager.remove_user_from_all_rooms(sid)
+        self.queue_presence(room_name, member_id, username, False, True)
+        self.speakers.remove_member(room_name, member_id)
+        self.mixer.remove_member(room_name, member_id)
+        return room_name
+
+    def queue_presence(self, room_name, member_id, username, present, was_present):
+        # Çok süreçli modda oda değişikliklerini sadece odanın worker'ı duyurur
+        if self.owns_room(room_name):
+            self.presence.queue(room_name, member_id, username, present, was_present)
+
+    def mix_listeners(self, room_name):
+        """Odanın bu süreçteki dinleyicileri: [(sid, gönderen indeksi, codec adı)]"""
+        return [(sid, self.sender_ids[sid], self.codecs.get(sid, DEFAULT_CODEC))
+                for sid in self.room_manager.get_room_users(room_name)
+                if sid in self.users and sid in self.sender_ids]
+
+    def owns_room(self, room_name):
+        return self.workers is None or self.workers.owns(room_name)
+
+    async def receive_remote_audio(self, stream_id, frame):
+        """Başka bir worker'dan gelen ses paketini buradaki dinleyicilere ilet"""
+        room_name = self.room_names.get(stream_id)
+        if room_name is None:
+            return
+        loudness = protocol.LEVEL_SILENT - protocol.read_level(frame)
+        if not self.speakers.update(room_name, protocol.read_sender(frame), loudness):
+            self.audio_stats['frames_filtered'] += 1
+            return
+        if self.mixer.is_mixing(room_name):
+            self.mixer.push(room_name, frame)
+            return
+        recipients = [user_sid for user_sid in self.room_manager.get_room_users(room_name)
+                      if user_sid in self.users]
+        if recipients:
+            self.audio_stats['frames_forwarded'] += len(recipients)
+            await self.fanout.broadcast('audio_data', frame, recipients)
+
+    async def get_history(self, room_name, limit=None, before=None, before_id=None):
+        """Oda geçmişini önce bellekten, yetmezse veritabanından getir"""
+        if before is None:
+            cached = self.history.get(room_name, limit)
+            if cached is not None:
+                return cached
+        messages = await self.db.get_room_messages(room_name, limit or self.history.size, before, before_id)
+        return [serialize_message(m.username, m.content, m.timestamp, m.id) for m in messages]
+
+    @staticmethod
+    def history_cursor(messages, limit):
+        """Bir sonraki (daha eski) sayfanın imleci; geçmiş bittiyse None"""
+        if len(messages) < limit:
+            return None
+        oldest = messages[-1]
+        return {'time': oldest['time'], 'id': oldest['id']}
+
+    def assign_sender_id(self, sid):
+        """Bağlantıya ses paketlerinde kullanılacak 16 bitlik bir indeks ata"""
+        if sid not in self.sender_ids:
+            used = set(self.sender_ids.values())
+            while self.next_sender_id in used:
+                self.advance_sender_id()
+            self.sender_ids[sid] = self.next_sender_id
+            self.advance_sender_id()
+        return self.sender_ids[sid]
+
+    def stream_id_available(self):
+        return bool(self.free_stream_ids) or self.next_stream_id <= 0xFFFF
+
+    def allocate_stream_id(self, room_name):
+        """Odaya boştaki en küçük 16 bitlik kimliği ver (kimlik kalmadıysa oda
+        yazılı sohbette kullanılabilir ama katılınamaz)"""
+        if self.free_stream_ids:
+            stream_id = heapq.heappop(self.free_stream_ids)
+        elif self.next_stream_id <= 0xFFFF:
+            stream_id = self.next_stream_id
+            self.next_stream_id += 1
+        else:
+            print(f'[LOG] Ses kimliği kalmadı, odaya katılınamaz: {room_name}')
+            return None
+        self.stream_ids[room_name] = stream_id
+        self.room_names[stream_id] = room_name
+        return stream_id
+
+    def advance_sender_id(self):
+        self.next_sender_id += self.sender_id_step
+        if self.next_sender_id > 0xFFFF:
+            self.next_sender_id = self.sender_id_start
+
+    async def evict_idle_rooms(self):
+        """Uzun süredir boş olan odaları ve geçmiş önbelleklerini bellekten bırak"""
+        interval = max(1.0, self.room_manager.idle_ttl / 2)
+        while True:
+            await asyncio.sleep(interval)
+            # Her worker sadece kendisine yerleştirilmiş odaları bırakır
+            for room_name in self.room_manager.idle_rooms():
+                if self.owns_room(room_name):
+                    await self.replicate('evict', room_name)
+
+    async def start(self, host='0.0.0.0', port=8080, sock=None, reuse_port=None):
         print(f'Server başlatılıyor... {host}:{port}')
-        runner = web.AppRunner(self.app)
-        await runner.setup()
-        site = web.TCPSite(runner, host, port)
+        await self.db.open()
+        self.room_ids = dict(self.db.room_ids)
+        # Kimlikler veritabanı sırasıyla verilir, her worker aynı sonucu bulur
+        for room_name, room_id in sorted(self.room_ids.items(), key=lambda item: item[1]):
+            self.allocate_stream_id(room_name)
+
+        self.message_writer.start()
+        if self.workers is None or self.workers.index == 0:
+            self.maintenance.start()  # Ortak veritabanının bakımını tek worker yapar
+        self.room_reaper = asyncio.create_task(self.evict_idle_rooms())
+        self.speakers.start()
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        if sock is not None:
+            site = web.SockSite(self.runner, sock)  # Üst süreçten devralınan soket
+        else:
+            site = web.TCPSite(self.runner, host, port, reuse_port=reuse_port)
         await site.start()
         print(f"Server başlatıldı ve dinlemeye başladı: {host}:{port}")  # Yeni log
+        if self.cluster is not None:
+            await self.cluster.start()
+
+    async def stop(self):
+        """Bekleyen mesajları yaz ve server'ı kapat"""
+        if self.cluster is not None:
+            await self.cluster.stop()  # Odalar diğer düğümlere devredilir
+        if self.room_reaper is not None:
+            self.room_reaper.cancel()
+            self.room_reaper = None
+        self.presence.stop()
+        self.speakers.stop()
+        self.mixer.stop()
+        self.outbound.stop()
+        await self.maintenance.stop()
+        await self.message_writer.stop()
+        await self.db.close()
+        if self.runner:
+            await self.runner.cleanup()
+        print("Server kapatıldı")
 
     async def handle_index(self, request):
         """Test için basit bir endpoint"""
         return web.Response(text="Voice Chat Server is running!", status=200)
 
+    async def handle_stats(self, request):
+        """Server sayaçları"""
+        return web.json_response({
+            'users': len(self.users),
+            'rooms': {'known': len(self.room_ids), **self.room_manager.get_stats()},
+            'presence': self.presence.get_stats(),
+            'speakers': self.speakers.get_stats(),
+            'audio': self.audio_stats,
+            'mixer': self.mixer.get_stats(),
+            'outbound': self.outbound.get_stats(),
+            'persistence': self.message_writer.get_stats(),
+            'database': self.db.get_stats(),
+            'maintenance': self.maintenance.stats,
+            'workers': self.workers.get_stats() if self.workers is not None else None,
+            'cluster': self.cluster.get_stats() if self.cluster is not None else None
+        })
+
 if __name__ == '__main__':
-    import asyncio
-    import sys
+    parser = argparse.ArgumentParser(description="Sesli sohbet server'ını çalıştır")
+    parser.add_argument('--retention-days', type=float,
+                        help="Mesajların arşive taşınmadan önce saklanacağı gün (varsayılan: süresiz)")
+    parser.add_argument('--retention-count', type=int,
+                        help="Oda başına veritabanında tutulacak en fazla mesaj (varsayılan: sınırsız)")
+    args = parser.parse_args()
 
     async def main():
-        server = VoiceChatServer()
+        server = VoiceChatServer(retention=retention_policy(args.retention_days, args.retention_count))
         await server.start()
         try:
             # Server'ı sürekli çalışır durumda tut
             while True:
                 await asyncio.sleep(1)
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, asyncio.CancelledError):
             print("Server kapatılıyor...")
+            await server.stop()
             sys.exit(0)
 
     asyncio.run(main())
\ No newline at end of file
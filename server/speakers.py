@@ -0,0 +1,165 @@
+import asyncio
+import time
+
+
+class RoomSpeakers:
+    """Bir odanın konuşmacı sıralaması"""
+
+    __slots__ = ('loudness', 'heard', 'active', 'priority')
+
+    def __init__(self):
+        self.loudness = {}  # {üye kimliği: yumuşatılmış ses yüksekliği}
+        self.heard = {}  # {üye kimliği: son ses paketinin geldiği an}
+        self.active = []  # Etkin konuşmacılar (seçilme sırasıyla)
+        self.priority = set()  # Sıralamaya bakılmadan iletilen üyeler
+
+
+class SpeakerSelector:
+    """Odalardaki etkin konuşmacıları seçer (selective forwarding).
+
+    İstemciler her ses paketinin başlığına paketin seviyesini yazar. Seviye
+    üye başına üstel ortalamayla yumuşatılır. En fazla `max_speakers`
+    konuşmacı etkin sayılır ve sadece onların paketleri dinleyicilere
+    iletilir (None: herkes iletilir, sadece etkin konuşmacılar duyurulur).
+    Yer doluysa yeni konuşmacı, etkinlerin en sessizinden `margin` kadar
+    yüksek olduğunda onun yerini alır; böylece benzer seviyedeki sesler
+    arasında sürekli geçiş olmaz. `hold` saniye paket göndermeyen konuşmacı
+    etkin listeden çıkar. Öncelikli üyeler bu sınıra sayılmaz ve yerinden
+    edilmez.
+
+    Etkin konuşmacılar her değişiklikte odaya active_speakers olayıyla
+    bildirilir.
+    """
+
+    def __init__(self, sio, max_speakers=None, hold=0.6, margin=6.0, smoothing=0.3, announces=None):
+        self.sio = sio
+        self.max_speakers = max_speakers
+        self.hold = hold
+        self.margin = margin
+        self.smoothing = smoothing
+        # Odanın değişikliklerini bu süreç mi duyurur (çok süreçli modda
+        # sıralamayı her worker kendisi yapar, duyuruyu odanın worker'ı)
+        self.announces = announces or (lambda room_name: True)
+        self.rooms = {}  # {oda adı: RoomSpeakers}
+        self.pending = set()  # Duyurusu kuyrukta olan odalar
+        self.task = None
+
+        self.stats = {
+            'changes': 0,
+            'events_sent': 0
+        }
+
+    def start(self):
+        """Susan konuşmacıları düzenli aralıklarla bırakan görevi başlat"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._expire_loop())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def update(self, room_name, member_id, loudness, now=None):
+        """Üyeden gelen ses paketini sırala; paket dinleyicilere iletilecekse True"""
+        room = self.rooms.get(room_name)
+        if room is None:
+            room = self.rooms[room_name] = RoomSpeakers()
+        now = time.monotonic() if now is None else now
+
+        previous = room.loudness.get(member_id)
+        smoothed = loudness if previous is None else previous + (loudness - previous) * self.smoothing
+        room.loudness[member_id] = smoothed
+        room.heard[member_id] = now
+        if member_id in room.active:
+            return True
+
+        if member_id in room.priority or self.max_speakers is None:
+            self._activate(room_name, room, member_id)
+            return True
+        candidates = [other for other in room.active if other not in room.priority]
+        if len(candidates) < self.max_speakers:
+            self._activate(room_name, room, member_id)
+            return True
+        weakest = min(candidates, key=room.loudness.__getitem__)
+        if smoothed > room.loudness[weakest] + self.margin:
+            room.active.remove(weakest)
+            self._activate(room_name, room, member_id)
+            return True
+        return False
+
+    def set_priority(self, room_name, member_id, priority):
+        room = self.rooms.get(room_name)
+        if room is None:
+            room = self.rooms[room_name] = RoomSpeakers()
+        if priority:
+            room.priority.add(member_id)
+        else:
+            room.priority.discard(member_id)
+        self._changed(room_name)
+
+    def remove_member(self, room_name, member_id):
+        """Odadan ayrılan üyeyi sıralamadan çıkar"""
+        room = self.rooms.get(room_name)
+        if room is None:
+            return
+        room.loudness.pop(member_id, None)
+        room.heard.pop(member_id, None)
+        changed = member_id in room.priority or member_id in room.active
+        room.priority.discard(member_id)
+        if member_id in room.active:
+            room.active.remove(member_id)
+        if changed:
+            self._changed(room_name)
+        if not room.loudness and not room.priority:
+            del self.rooms[room_name]
+
+    def discard(self, room_name):
+        """Silinen ya da bırakılan odanın sıralamasını unut"""
+        self.rooms.pop(room_name, None)
+
+    def expire(self, now=None):
+        """`hold` saniyedir paket göndermeyen konuşmacıları etkin listeden çıkar"""
+        now = time.monotonic() if now is None else now
+        for room_name, room in self.rooms.items():
+            silent = [member_id for member_id in room.active if now - room.heard[member_id] >= self.hold]
+            for member_id in silent:
+                room.active.remove(member_id)
+            if silent:
+                self._changed(room_name)
+
+    def get_active(self, room_name):
+        """Odanın etkin konuşmacıları ve öncelikli üyeleri"""
+        room = self.rooms.get(room_name)
+        if room is None:
+            return {'speakers': [], 'priority': []}
+        return {'speakers': list(room.active), 'priority': sorted(room.priority)}
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            'max_speakers': self.max_speakers,
+            'rooms': len(self.rooms),
+            'active_speakers': sum(len(room.active) for room in self.rooms.values())
+        }
+
+    def _activate(self, room_name, room, member_id):
+        room.active.append(member_id)
+        self._changed(room_name)
+
+    def _changed(self, room_name):
+        self.stats['changes'] += 1
+        # Aynı döngü turundaki değişiklikler tek olayda duyurulur
+        if room_name not in self.pending and self.announces(room_name):
+            self.pending.add(room_name)
+            asyncio.get_running_loop().create_task(self._announce(room_name))
+
+    async def _announce(self, room_name):
+        self.pending.discard(room_name)
+        self.stats['events_sent'] += 1
+        await self.sio.emit('active_speakers', {'room': room_name, **self.get_active(room_name)},
+                            room=room_name)
+
+    async def _expire_loop(self):
+        while True:
+            await asyncio.sleep(self.hold / 2)
+            self.expire()
@@ -0,0 +1,215 @@
+import re
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import datetime
+
+# Hiç oda olmayan yeni bir depolama bu odalarla başlar
+DEFAULT_ROOMS = ["Genel Sohbet", "Oyun Odası", "Müzik Odası"]
+
+# Depolamadan dönen mesaj kaydı (SQL satırları da aynı alanlara sahiptir)
+StoredMessage = namedtuple('StoredMessage', 'id room_id username content timestamp')
+
+
+class Storage:
+    """Server'ın oda ve mesaj kayıtları için kullandığı asenkron arayüz.
+
+    Bütün çağrılar olay döngüsünde await edilir, veritabanı beklenirken ses
+    dağıtımı çalışmaya devam eder. Gerçekleştirimler:
+      - database.Database: SQLAlchemy asyncio motoru (SQLite/aiosqlite ya da
+        PostgreSQL/asyncpg)
+      - MemoryStorage: testler ve yerel denemeler için bellek içi yedek
+    """
+
+    def __init__(self):
+        # Oda adı -> id önbelleği (her sorguda oda araması yapmamak için)
+        self.room_ids = {}
+
+    def get_room_id(self, room_name):
+        """Oda adına karşılık gelen id (yoksa None)"""
+        return self.room_ids.get(room_name)
+
+    def remember_room(self, room_name, room_id):
+        """Başka bir süreçte oluşturulan odayı id önbelleğine ekle"""
+        self.room_ids[room_name] = room_id
+
+    def forget_room(self, room_name):
+        """Silinen odayı id önbelleğinden çıkar; id'sini döndürür (yoksa None)"""
+        return self.room_ids.pop(room_name, None)
+
+    async def open(self):
+        """Şemayı hazırla, varsayılan odaları oluştur ve oda id'lerini yükle"""
+        raise NotImplementedError
+
+    async def create_room(self, room_name):
+        """Yeni oda oluştur; id'sini döndürür (oda zaten varsa None)"""
+        raise NotImplementedError
+
+    async def delete_room(self, room_id):
+        """forget_room() ile bırakılan odayı ve mesajlarını sil; oda yoksa False"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Bağlantıları kapat"""
+
+    async def add_message(self, room_name, username, content, timestamp=None):
+        """Yeni mesaj ekle"""
+        await self.add_messages([(room_name, username, content, timestamp or datetime.now())])
+
+    async def add_messages(self, messages):
+        """Birden fazla mesajı tek seferde ekle.
+
+        messages: (oda adı, kullanıcı adı, içerik, zaman) demetleri
+        Verilen sırada eklenen id'leri döndürür (odası olmayanlar için None).
+        """
+        raise NotImplementedError
+
+    async def get_room_messages(self, room_name, limit=50, before=None, before_id=None):
+        """Odadaki son mesajları yeniden eskiye getir ((zaman, id) imleci ile sayfalı)"""
+        raise NotImplementedError
+
+    async def search_messages(self, query, room_name=None, limit=20, offset=0):
+        """Mesajlarda tam metin arama (en alakalı önce)"""
+        raise NotImplementedError
+
+    async def get_expired_messages(self, room_name, max_age=None, max_count=None, limit=500):
+        """Saklama süresini aşmış en eski mesajları eskiden yeniye getir"""
+        raise NotImplementedError
+
+    async def delete_messages(self, message_ids):
+        """Verilen id'lere sahip mesajları sil"""
+        raise NotImplementedError
+
+    async def incremental_vacuum(self, pages):
+        """Boş sayfaları geri ver; geri verilen sayfa sayısını döndürür"""
+        return 0
+
+    async def checkpoint(self):
+        """Bekleyen günlük kayıtlarını ana dosyaya aktar"""
+        return None
+
+    def get_stats(self):
+        """Depolamaya özgü sayaçlar"""
+        return {}
+
+
+class MemoryStorage(Storage):
+    """Her şeyi bellekte tutan depolama.
+
+    Veritabanı kurmadan server'ı çalıştırmak ve testlerde gerçek depolamanın
+    yerine kullanmak içindir; server kapanınca kayıtlar kaybolur. Her odanın
+    mesajları (zaman, id) sırasında tutulur, böylece sayfalama ve saklama
+    kuralları SQL gerçekleştirimiyle aynı sonucu verir.
+    """
+
+    def __init__(self, rooms=None):
+        super().__init__()
+        self.default_rooms = DEFAULT_ROOMS if rooms is None else rooms
+        self.messages = {}  # {oda id: [StoredMessage] (eskiden yeniye)}
+        self.message_rooms = {}  # {mesaj id: oda id}
+        self.next_id = 1
+        self.next_room_id = 1
+
+    async def open(self):
+        if not self.room_ids:
+            for room_name in self.default_rooms:
+                await self.create_room(room_name)
+
+    async def create_room(self, room_name):
+        if room_name in self.room_ids:
+            return None
+        room_id = self.room_ids[room_name] = self.next_room_id
+        self.next_room_id += 1
+        self.messages[room_id] = []
+        return room_id
+
+    async def delete_room(self, room_id):
+        if room_id not in self.messages:
+            return False
+        for message in self.messages.pop(room_id):
+            del self.message_rooms[message.id]
+        return True
+
+    async def add_messages(self, messages):
+        ids = []
+        for room_name, username, content, timestamp in messages:
+            room_id = self.get_room_id(room_name)
+            if room_id is None:
+                ids.append(None)
+                continue
+            message = StoredMessage(self.next_id, room_id, username, content, timestamp)
+            self.next_id += 1
+            insort(self.messages[room_id], message, key=self._sort_key)
+            self.message_rooms[message.id] = room_id
+            ids.append(message.id)
+        return ids
+
+    async def get_room_messages(self, room_name, limit=50, before=None, before_id=None):
+        room_id = self.get_room_id(room_name)
+        if room_id is None:
+            return []
+        history = self.messages[room_id]
+        end = len(history)
+        if before is not None:
+            boundary = (before, before_id if before_id is not None else float('-inf'))
+            end = bisect_left(history, boundary, key=self._sort_key)
+        return history[max(0, end - limit):end][::-1]
+
+    async def search_messages(self, query, room_name=None, limit=20, offset=0):
+        terms = [term.lower() for term in query.split()]
+        if not terms:
+            return []
+        if room_name is not None:
+            room_id = self.get_room_id(room_name)
+            if room_id is None:
+                return []
+            room_ids = [room_id]
+        else:
+            room_ids = list(self.messages)
+
+        room_names = {room_id: name for name, room_id in self.room_ids.items()}
+        matches = []
+        for room_id in room_ids:
+            for message in self.messages[room_id]:
+                words = re.findall(r'\w+', message.content.lower())
+                counts = [words.count(term) for term in terms]
+                if all(counts):
+                    matches.append((-sum(counts) / len(words), message))
+        # Daha çok geçen önce, eşitlikte yeni mesaj önce
+        matches.sort(key=lambda match: (match[0], -match[1].id))
+        return [{
+            'id': message.id,
+            'room': room_names.get(message.room_id),
+            'username': message.username,
+            'content': message.content,
+            'timestamp': message.timestamp,
+            'rank': rank
+        } for rank, message in matches[offset:offset + limit]]
+
+    async def get_expired_messages(self, room_name, max_age=None, max_count=None, limit=500):
+        room_id = self.get_room_id(room_name)
+        if room_id is None or (max_age is None and max_count is None):
+            return []
+        history = self.messages[room_id]
+        # Her iki kural da en eski mesajlardan oluşan bir ön ek seçer
+        expired = 0
+        if max_age is not None:
+            expired = bisect_left(history, (datetime.now() - max_age, float('-inf')), key=self._sort_key)
+        if max_count is not None:
+            expired = max(expired, len(history) - max_count)
+        return history[:min(expired, limit)]
+
+    async def delete_messages(self, message_ids):
+        by_room = {}
+        for message_id in message_ids:
+            room_id = self.message_rooms.pop(message_id, None)
+            if room_id is not None:
+                by_room.setdefault(room_id, set()).add(message_id)
+        for room_id, ids in by_room.items():
+            self.messages[room_id] = [m for m in self.messages[room_id] if m.id not in ids]
+
+    def get_stats(self):
+        return {'messages': len(self.message_rooms)}
+
+    @staticmethod
+    def _sort_key(message):
+        return (message.timestamp, message.id)
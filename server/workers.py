@@ -0,0 +1,264 @@
+"""Çok süreçli server.
+
+Üst süreç dinleme soketini ve mesaj yolu aracısını açar, sonra N worker
+süreci çatallar (pre-fork). Worker'lar aynı soketten bağlantı kabul eder
+(--reuse-port ile her worker kendi SO_REUSEPORT soketini açar ve yükü
+çekirdek dağıtır). Oda durumu bütün worker'larda aynı sırayla uygulanan
+değişikliklerle eşlenir, ses paketleri ve Socket.IO olayları mesaj yolu
+üzerinden diğer worker'lardaki dinleyicilere ulaştırılır.
+
+Kullanım:
+    python server/workers.py --workers 4 [--port 8080] [--db sqlite:///chat.db]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import pickle
+import signal
+import socket
+import struct
+import tempfile
+import zlib
+
+from bus import BusBroker, MessageBus, KIND_AUDIO, KIND_STATE, MAX_WORKERS
+from database import Database
+from maintenance import retention_policy
+from server import VoiceChatServer
+
+# Başka worker'a giden ses paketinin önüne eklenen oda kimliği
+AUDIO_ROOM = struct.Struct('!H')
+
+
+class WorkerGroup:
+    """Bir worker'ın gruptaki yeri ve diğer worker'larla bağlantısı.
+
+    Her oda bir worker'a yerleştirilir (oda adının özeti ile); üyelik
+    değişikliklerinin toplu duyurusu ve boş odanın bırakılması gibi odaya
+    ait işler sadece o worker'da yapılır. Üyelik değişiklikleri ise
+    replicate() ile mesaj yoluna yazılır ve her worker'da (gönderen dahil)
+    aracının belirlediği sırayla uygulanır; böylece oda sürümleri her yerde
+    aynı kalır.
+
+    Üye kimlikleri worker indeksine göre dağıtıldığı için (worker i
+    i + 1, i + 1 + N, ... kimliklerini verir) odanın üye listesi hangi
+    worker'larda dinleyicisi olduğunu gösterir; ses paketleri sadece o
+    worker'lara ve konuşmacıları duyuran oda sahibine gönderilir.
+    """
+
+    def __init__(self, bus, index, count):
+        self.bus = bus
+        self.index = index
+        self.count = count
+        self.apply = None  # async (işlem, argümanlar) -> sonuç
+        self.receive_audio = None  # async (oda kimliği, paket)
+        self.pending = {}  # {sıra no: (Future, işlem, argümanlar)} bu worker'ın beklediği sonuçlar
+        self.next_seq = 0
+
+        self.stats = {
+            'state_changes': 0,
+            'audio_sent': 0,
+            'audio_local': 0,  # Başka worker'da dinleyicisi olmadığı için gönderilmeyenler
+            'audio_received': 0
+        }
+        bus.subscribe(KIND_STATE, self._on_state)
+        bus.subscribe(KIND_AUDIO, self._on_audio)
+        bus.close_callbacks.append(self._on_close)
+
+    def bind(self, apply, receive_audio):
+        self.apply = apply
+        self.receive_audio = receive_audio
+
+    def owner_of(self, room_name):
+        """Odanın yerleştirildiği worker"""
+        return zlib.crc32(room_name.encode('utf-8')) % self.count
+
+    def owns(self, room_name):
+        """Oda bu worker'a mı yerleştirilmiş"""
+        return self.owner_of(room_name) == self.index
+
+    def worker_of(self, member_id):
+        """Üye kimliğini veren worker (kimlikler worker sayısı adımıyla dağıtılır)"""
+        return (member_id - 1) % self.count
+
+    async def replicate(self, op, args):
+        """Değişikliği bütün worker'lara gönder; bu worker'da uygulanınca sonucunu döndür"""
+        if not self.bus.connected:
+            return await self.apply(op, args)  # Kapanış sırasında sadece yerel durum
+        seq = self.next_seq
+        self.next_seq += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[seq] = (future, op, args)
+        self.bus.publish(KIND_STATE, pickle.dumps((seq, op, args)))
+        return await future
+
+    def forward_audio(self, room_name, stream_id, frame, member_ids):
+        """Ses paketini odada üyesi olan diğer worker'lara gönder"""
+        targets = 1 << self.owner_of(room_name)
+        for member_id in member_ids:
+            targets |= 1 << self.worker_of(member_id)
+        targets &= ~(1 << self.index)
+        if not targets:
+            self.stats['audio_local'] += 1
+            return
+        self.bus.publish(KIND_AUDIO, AUDIO_ROOM.pack(stream_id) + frame, targets)
+        self.stats['audio_sent'] += 1
+
+    def get_stats(self):
+        return {
+            'index': self.index,
+            'count': self.count,
+            **self.stats,
+            'bus': self.bus.stats
+        }
+
+    async def _on_state(self, origin, payload):
+        seq, op, args = pickle.loads(payload)
+        self.stats['state_changes'] += 1
+        future = self.pending.pop(seq, (None,))[0] if origin == self.index else None
+        try:
+            result = await self.apply(op, args)
+        except Exception as e:
+            if future is None:
+                raise
+            future.set_exception(e)
+            return
+        if future is not None:
+            future.set_result(result)
+
+    def _on_close(self):
+        # Geri gelmeyecek değişiklikleri yerelde uygula ki bekleyenler takılmasın
+        pending, self.pending = self.pending, {}
+        for future, op, args in pending.values():
+            asyncio.ensure_future(self._apply_locally(future, op, args))
+
+    async def _apply_locally(self, future, op, args):
+        try:
+            future.set_result(await self.apply(op, args))
+        except Exception as e:
+            future.set_exception(e)
+
+    async def _on_audio(self, origin, payload):
+        self.stats['audio_received'] += 1
+        stream_id, = AUDIO_ROOM.unpack_from(payload)
+        await self.receive_audio(stream_id, payload[AUDIO_ROOM.size:])
+
+
+def run_worker(index, count, sock, bus_path, db_url, host, port, reuse_port, room_idle_ttl, max_speakers,
+               retention):
+    """Worker süreci: kendi olay döngüsünde bir VoiceChatServer çalıştırır.
+
+    Ctrl+C bütün süreç grubuna gider; worker'lar onu yok sayar ve üst
+    sürecin göndereceği SIGTERM ile düzgünce kapanır.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent_pid = os.getppid()
+
+    async def main():
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        bus = MessageBus(bus_path, origin=index)
+        workers = WorkerGroup(bus, index, count)
+        server = VoiceChatServer(storage=Database(db_url), room_idle_ttl=room_idle_ttl, workers=workers,
+                                 max_speakers=max_speakers, retention=retention)
+        await bus.connect()
+        if reuse_port:
+            await server.start(host, port, reuse_port=True)
+        else:
+            await server.start(sock=sock)
+        print(f"Worker {index}/{count} hazır (pid {os.getpid()})")
+        try:
+            # Üst süreç beklenmedik şekilde ölürse worker'lar da kapanır
+            while os.getppid() == parent_pid:
+                await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+        await server.stop()
+        await bus.close()
+
+    asyncio.run(main())
+
+
+async def prepare_storage(db_url):
+    """Şemayı ve varsayılan odaları worker'lar başlamadan bir kez oluştur"""
+    db = Database(db_url)
+    await db.open()
+    await db.close()
+
+
+async def supervise(broker, bus_sock, processes):
+    """Aracıyı çalıştır; bir worker durursa ya da Ctrl+C gelirse hepsini kapat"""
+    await broker.start(sock=bus_sock)
+    loop = asyncio.get_running_loop()
+    try:
+        while all(process.is_alive() for process in processes):
+            await asyncio.sleep(0.5)
+        print("Bir worker durdu, server kapatılıyor...")
+    finally:
+        # SIGTERM alan worker'lar bekleyen mesajları yazıp kapanır; aracı
+        # onlar bitene kadar açık kalır
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            await loop.run_in_executor(None, process.join, 15)
+            if process.is_alive():
+                process.kill()
+        await broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sesli sohbet server'ını birden fazla süreçte çalıştır")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--db', default='sqlite:///chat.db')
+    parser.add_argument('--room-idle-ttl', type=float, default=300,
+                        help="Boş odaların bellekten bırakılma süresi (sn)")
+    parser.add_argument('--max-speakers', type=int,
+                        help="Odada sesi iletilecek en fazla konuşmacı (varsayılan: hepsi)")
+    parser.add_argument('--retention-days', type=float,
+                        help="Mesajların arşive taşınmadan önce saklanacağı gün (varsayılan: süresiz)")
+    parser.add_argument('--retention-count', type=int,
+                        help="Oda başına veritabanında tutulacak en fazla mesaj (varsayılan: sınırsız)")
+    parser.add_argument('--reuse-port', action='store_true',
+                        help="Her worker kendi SO_REUSEPORT soketini açsın")
+    args = parser.parse_args()
+    if not 1 <= args.workers <= MAX_WORKERS:
+        parser.error(f"--workers 1 ile {MAX_WORKERS} arasında olmalı")
+
+    asyncio.run(prepare_storage(args.db))
+
+    sock = None
+    if not args.reuse_port:
+        sock = socket.create_server((args.host, args.port), backlog=1024)
+        sock.setblocking(False)
+
+    bus_path = os.path.join(tempfile.mkdtemp(prefix='voice-chat-'), 'bus.sock')
+    bus_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    bus_sock.bind(bus_path)
+    bus_sock.listen(args.workers)
+
+    # Worker'lar üst süreçte olay döngüsü çalışmazken çatallanır
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=run_worker, name=f'worker-{index}',
+                        args=(index, args.workers, sock, bus_path, args.db,
+                              args.host, args.port, args.reuse_port, args.room_idle_ttl, args.max_speakers,
+                              retention_policy(args.retention_days, args.retention_count)))
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"{args.workers} worker başlatıldı: {args.host}:{args.port}")
+
+    try:
+        asyncio.run(supervise(BusBroker(bus_path), bus_sock, processes))
+    except KeyboardInterrupt:
+        print("Server kapatılıyor...")
+    finally:
+        os.unlink(bus_path)
+        os.rmdir(os.path.dirname(bus_path))
+
+
+if __name__ == '__main__':
+    main()